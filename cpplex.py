@@ -21,11 +21,27 @@ import os
 import sys
 import re
 
+from array import array
+from collections import OrderedDict
 
-class Token:
-	def __init__(self, value, kind):
-		self.value = value
-		self.kind  = kind
+
+class Token(object):
+	__slots__ = ('value', 'kind')
+
+	def __new__(cls, value, kind=None):
+		self = object.__new__(cls)
+		object.__setattr__(self, 'value', value)
+		object.__setattr__(self, 'kind', kind)
+		return self
+
+	def __setattr__(self, name, value):
+		raise AttributeError('%s objects are immutable' % self.__class__.__name__)
+
+	def __delattr__(self, name):
+		raise AttributeError('%s objects are immutable' % self.__class__.__name__)
+
+	def __reduce__(self):
+		return (self.__class__, (self.value, self.kind))
 
 	def __repr__(self):
 		if self.kind:
@@ -33,9 +49,46 @@ class Token:
 		return '%s(%s)' % (self.__class__.__name__, repr(self.value))
 
 
+# Keyword, operator and common whitespace tokens are shared, so creating one of
+# these tokens returns the same object each time.
+_interned = {}
+
+
+def _intern(cls, value, kind):
+	key = (cls, value, kind)
+	try:
+		return _interned[key]
+	except KeyError:
+		token = Token.__new__(cls, value, kind)
+		if '_html' in cls.__slots__:
+			object.__setattr__(token, '_html', cls.format_html(token))
+		_interned[key] = token
+		return token
+
+
+_escaped_characters = re.compile('[&<>]')
+
+
+def escape(text):
+	"""
+	Escape the HTML special characters in the text.
+
+	Most text does not contain any of these characters, so it is scanned once
+	and returned unchanged if there is nothing to escape.
+	"""
+	if not _escaped_characters.search(text):
+		return text
+	return text.replace('&', '&amp;').replace('<', '&lt;').replace('>', '&gt;')
+
+
 class WhiteSpace(Token):
-	def __init__(self, value, kind=None):
-		Token.__init__(self, value, kind)
+	__slots__ = ()
+
+	def __new__(cls, value, kind=None):
+		try:
+			return _interned[(cls, value, kind)]
+		except KeyError:
+			return Token.__new__(cls, value, kind)
 
 	@property
 	def html(self):
@@ -43,8 +96,7 @@ class WhiteSpace(Token):
 
 
 class Identifier(Token):
-	def __init__(self, value, kind=None):
-		Token.__init__(self, value, kind)
+	__slots__ = ()
 
 	@property
 	def html(self):
@@ -52,30 +104,46 @@ class Identifier(Token):
 
 
 class Keyword(Token):
-	def __init__(self, value, kind=None):
-		Token.__init__(self, value, kind)
+	__slots__ = ('_html',)
+
+	def __new__(cls, value, kind=None):
+		return _intern(cls, value, kind)
+
+	def format_html(self):
+		return '<span class="keyword">%s</span>' % self.value
 
 	@property
 	def html(self):
-		return '<span class="keyword">%s</span>' % self.value
+		return self._html
 
 
 class Operator(Token):
-	def __init__(self, value, kind=None):
-		Token.__init__(self, value, kind)
+	__slots__ = ('_html',)
+
+	def __new__(cls, value, kind=None):
+		return _intern(cls, value, kind)
+
+	def format_html(self):
+		return '<span class="operator">%s</span>' % escape(self.value)
 
 	@property
 	def html(self):
-		return '<span class="operator">%s</span>' % self.value
+		return self._html
 
 
 class Literal(Token):
-	def __init__(self, value, kind):
-		Token.__init__(self, value, kind)
+	__slots__ = ()
+
+	def __new__(cls, value, kind):
+		return Token.__new__(cls, value, kind)
 
 	@property
 	def html(self):
-		return '<span class="literal %s">%s</span>' % (self.kind, self.value)
+		return '<span class="literal %s">%s</span>' % (self.kind, escape(self.value))
+
+
+for _whitespace in [' ', '  ', '    ', '\t', '\n', '\r\n']:
+	_intern(WhiteSpace, _whitespace, None)
 
 
 _keywords = [ # 2.11 [lex.key]
@@ -206,19 +274,158 @@ _tokens = [
 ]
 
 
+# The token patterns are combined into a single regular expression, with each
+# pattern in its own named group. Python tries the alternatives in order, so
+# the first matching pattern in _tokens wins, as it would when matching each
+# pattern in turn.
+_token_matcher = re.compile('|'.join(['(?P<t%d>%s)' % (i, matcher.pattern) for i, (matcher, _, _) in enumerate(_tokens)]))
+_token_types = dict([('t%d' % i, (token, kind)) for i, (_, token, kind) in enumerate(_tokens)])
+_token_codes = dict([('t%d' % i, i) for i in range(len(_tokens))])
+
+
 def match_token(text, pos):
-	for matcher, token, kind in _tokens:
-		m = matcher.match(text, pos)
-		if m:
-			return token(m.group(0), kind), m.end()
+	m = _token_matcher.match(text, pos)
+	if m:
+		token, kind = _token_types[m.lastgroup]
+		return token(m.group(0), kind), m.end()
 	return None, None
 
 
 def tokenize(text):
 	pos = 0
-	while pos < len(text):
+	length = len(text)
+	while pos < length:
 		token, end = match_token(text, pos)
 		if not token:
 			raise Exception('Invalid C++ token : %s' % text[pos:])
 		pos = end
 		yield token
+
+
+class TokenStream(object):
+	"""
+	A columnar sequence of tokens over a text buffer.
+
+	Each token is stored as an index into `_tokens` (giving its token class and
+	literal kind) and its start and end offsets in the text. Token objects are
+	only created when they are accessed. Slicing a stream returns a view over
+	the same arrays, so no token data is copied.
+	"""
+
+	__slots__ = ('text', 'codes', 'starts', 'ends', '_first', '_last')
+
+	def __init__(self, text, codes, starts, ends, first=0, last=None):
+		self.text = text
+		self.codes = codes
+		self.starts = starts
+		self.ends = ends
+		self._first = first
+		self._last = len(codes) if last is None else last
+
+	def __len__(self):
+		return self._last - self._first
+
+	def __iter__(self):
+		for i in range(self._first, self._last):
+			_, token, kind = _tokens[self.codes[i]]
+			yield token(self.text[self.starts[i]:self.ends[i]], kind)
+
+	def _index(self, index):
+		if index < 0:
+			index = index + len(self)
+		if index < 0 or index >= len(self):
+			raise IndexError('token index out of range')
+		return self._first + index
+
+	def __getitem__(self, index):
+		if isinstance(index, slice):
+			first, last, step = index.indices(len(self))
+			if step != 1:
+				raise ValueError('token stream slices must be contiguous')
+			last = max(first, last)
+			return TokenStream(self.text, self.codes, self.starts, self.ends, self._first + first, self._first + last)
+		i = self._index(index)
+		_, token, kind = _tokens[self.codes[i]]
+		return token(self.text[self.starts[i]:self.ends[i]], kind)
+
+	def __repr__(self):
+		return 'TokenStream(%s)' % repr(list(self))
+
+	def token_type(self, index):
+		return _tokens[self.codes[self._index(index)]][1]
+
+	def value(self, index):
+		i = self._index(index)
+		return self.text[self.starts[i]:self.ends[i]]
+
+
+def tokenize_stream(text):
+	codes = array('B')
+	starts = array('I')
+	ends = array('I')
+	pos = 0
+	length = len(text)
+	while pos < length:
+		m = _token_matcher.match(text, pos)
+		if not m:
+			raise Exception('Invalid C++ token : %s' % text[pos:])
+		end = m.end()
+		codes.append(_token_codes[m.lastgroup])
+		starts.append(pos)
+		ends.append(end)
+		pos = end
+	return TokenStream(text, codes, starts, ends)
+
+
+def render_html(tokens):
+	"""
+	Render a sequence of tokens as a single HTML string.
+
+	The sequence can also contain other objects with an `html` property, such
+	as the item references in a doxygen type.
+	"""
+	return ''.join([token.html for token in tokens])
+
+
+class TokenCache(object):
+	"""
+	A bounded, least-recently-used cache of the tokens for a given text.
+
+	The tokens are stored as a tuple. As tokens are immutable, the same tokens
+	can be shared by everything that tokenizes the same text. A size of None
+	does not limit the number of entries in the cache.
+	"""
+
+	def __init__(self, size=4096):
+		self.size = size
+		self.hits = 0
+		self.misses = 0
+		self._entries = OrderedDict()
+
+	def __len__(self):
+		return len(self._entries)
+
+	def clear(self):
+		self.hits = 0
+		self.misses = 0
+		self._entries.clear()
+
+	def tokenize(self, text):
+		try:
+			tokens = self._entries.pop(text)
+			self.hits = self.hits + 1
+		except KeyError:
+			tokens = tuple(tokenize(text))
+			self.misses = self.misses + 1
+			if self.size is not None:
+				if self.size <= 0:
+					return tokens
+				while len(self._entries) >= self.size:
+					self._entries.popitem(last=False)
+		self._entries[text] = tokens
+		return tokens
+
+
+_token_cache = TokenCache()
+def cached_tokenize(text):
+	return _token_cache.tokenize(text)
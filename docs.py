@@ -94,21 +94,14 @@ class documentationPreProcessor(markdown.preprocessors.Preprocessor):
 		return ret
 
 
-def equivalent(list1, list2):
-	if len(list1) != len(list2):
-		return False
-	for i in range(0, len(list1)):
-		if list1[i] != list2[i]:
-			return False
-	return True
-
-
 class documentationProcessor(markdown.treeprocessors.Treeprocessor):
-	def __init__(self, items):
+	def __init__(self, items, documented=None):
 		self.items = items
+		self.documented = documented if documented is not None else []
 		self.clear()
 
 	def clear(self):
+		self.qname = None
 		self.refs = None
 		self.doc = None
 		self.param_doc = {}
@@ -119,11 +112,10 @@ class documentationProcessor(markdown.treeprocessors.Treeprocessor):
 			matching.append(self.refs[0].item)
 		else:
 			docargs = sorted([x for x in self.param_doc.keys() if x != 'return'])
-			matching = []
-			for ref in self.refs:
-				args = sorted([x.name for x in ref.item.args])
-				if equivalent(docargs, args):
-					matching.append(ref.item)
+			if hasattr(self.items, 'overloads'):
+				matching = self.items.overloads(self.qname).get(tuple(docargs), [])
+			else: # a plain dictionary of the items
+				matching = [ref.item for ref in self.refs if sorted([x.name for x in ref.item.args]) == docargs]
 
 		if len(matching) == 0:
 			docargs = sorted([x for x in self.param_doc.keys() if x != 'return'])
@@ -132,6 +124,7 @@ class documentationProcessor(markdown.treeprocessors.Treeprocessor):
 			if i == 1:
 				sys.stdout.write('info: multiple matching {0} type found for the given parameters: {1}\n'.format(self.refs[0].item.qname, ', '.join(docargs)))
 			item.docs = self.doc
+			self.documented.append(item)
 			for argname, doc in self.param_doc.items():
 				if argname == 'return':
 					item.retdoc = doc
@@ -149,6 +142,7 @@ class documentationProcessor(markdown.treeprocessors.Treeprocessor):
 						self.process_documentation()
 					try:
 						self.refs = self.items[e.text]
+						self.qname = e.text
 						self.doc = Documentation()
 						self.param_doc = {}
 					except KeyError:
@@ -189,12 +183,33 @@ class documentationProcessor(markdown.treeprocessors.Treeprocessor):
 class Extension(markdown.extensions.Extension):
 	def __init__(self, items):
 		self.items = items
+		self.documented = []
 
 	def extendMarkdown(self, md, md_globals):
 		md.preprocessors.add('cldoc', cldocPreProcessor(), '_end')
 		md.preprocessors.add('docs', documentationPreProcessor(), '_end')
-		md.treeprocessors.add('docs', documentationProcessor(self.items), '_end')
+		md.treeprocessors.add('docs', documentationProcessor(self.items, self.documented), '_end')
+
+def retract(items):
+	"""
+	Remove the documentation that `parse` bound to the items.
+	"""
+	for item in items:
+		item.docs = None
+		if hasattr(item, 'retdoc'):
+			item.retdoc = None
+		for arg in getattr(item, 'args', []):
+			arg.docs = None
 
 def parse(filename, items):
+	"""
+	Bind the documentation in the markdown file to the items it documents,
+	returning the list of documented items.
+
+	The `items` map the qualified names to the item references. If it is an
+	`ItemRegistry`, its overload index is used to find the overloaded items.
+	"""
+	extension = Extension(items)
 	with codecs.open(filename, 'r', encoding='utf-8') as f:
-		html = markdown.markdown(f.read(), extensions=['extra', Extension(items)])
+		html = markdown.markdown(f.read(), extensions=['extra', extension])
+	return extension.documented
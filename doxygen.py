@@ -19,6 +19,16 @@
 
 import os
 import sys
+import mmap
+import time
+import json
+import pickle
+import hashlib
+import argparse
+import multiprocessing
+
+from array import array
+from collections import OrderedDict
 
 import xmlapi
 import cpplex
@@ -33,6 +43,8 @@ class Item:
 		self.qname = name
 		self.children = []
 		self.docs = None
+		self.source = None
+		self.docs_source = None
 
 	def __repr__(self):
 		return 'Item({0}, {1}, {2})'.format(self.protection, self.kind, self.name)
@@ -48,12 +60,17 @@ class Function(Item):
 		Item.__init__(self, protection, kind, name)
 		self.args = []
 		self.retdoc = None
+		self._arg_names = {}
+
+	def add_arg(self, arg):
+		self.args.append(arg)
+		self._arg_names.setdefault(arg.name, arg)
 
 	def arg(self, name):
-		for a in self.args:
-			if a.name == name:
-				return a
-		raise KeyError('argument %s not found' % name)
+		try:
+			return self._arg_names[name]
+		except KeyError:
+			raise KeyError('argument %s not found' % name)
 
 
 class FunctionPointer(Function):
@@ -62,18 +79,168 @@ class FunctionPointer(Function):
 
 
 def get_scoped_name(item, scope):
-	a = item.qname.split('::')
-	b = scope.qname.split('::') if scope else []
-	for n in range(1, len(a)+1):
-		if n <= len(b) and a[n-1] == b[n-1]:
+	a = _items.path(item.qname)
+	b = _items.path(scope.qname) if scope else ()
+	for n, node in enumerate(a):
+		if n < len(b) and b[n] is node:
 			continue
-		yield a[n-1], '::'.join(a[0:n])
+		yield node.name, node.qname
 
 
-_items = {}
+_names = {}
+def _intern_name(name):
+	return _names.setdefault(name, name)
 
 
-def signature(item, scope):
+class ScopeNode(object):
+	"""
+	A component of a qualified name in the scope tree of an `ItemRegistry`.
+
+	The `path` of a node is the nodes from the outermost scope to that node,
+	and `refs` is the list of item references registered with that name, or
+	None if the node is only a scope of the registered names.
+	"""
+	__slots__ = ('name', 'qname', 'parent', 'path', 'children', 'refs')
+
+	def __init__(self, name, parent):
+		self.name = _intern_name(name)
+		self.parent = parent
+		if parent and parent.qname:
+			self.qname = _intern_name('{0}::{1}'.format(parent.qname, name))
+			self.path = parent.path + (self,)
+		else:
+			self.qname = self.name
+			self.path = (self,) if parent else ()
+		self.children = OrderedDict()
+		self.refs = None
+
+
+class ItemRegistry(dict):
+	"""
+	Maps a qualified name to the references of the items with that name.
+
+	If the name is not found, the deferred members of the compounds that could
+	contain that item, and the deferred non-public members that could be or
+	contain that item, are built before looking it up again.
+
+	The names are also stored in a tree of their `::` separated components, so
+	the scopes and contents of a name can be found without splitting and
+	joining the names.
+	"""
+
+	def __init__(self):
+		dict.__init__(self)
+		self._root = ScopeNode('', None)
+		self._nodes = {}
+		self._overloads = {}
+
+	def __setitem__(self, qname, refs):
+		dict.__setitem__(self, qname, refs)
+		self._node(qname).refs = refs
+
+	def __delitem__(self, qname):
+		dict.__delitem__(self, qname)
+		self._nodes[qname].refs = None
+
+	def clear(self):
+		dict.clear(self)
+		self._root = ScopeNode('', None)
+		self._nodes = {}
+		self._overloads = {}
+
+	def update(self, other):
+		for qname, refs in other.items():
+			self[qname] = refs
+
+	def _node(self, qname):
+		try:
+			return self._nodes[qname]
+		except KeyError:
+			pass
+		node = self._root
+		for name in qname.split('::'):
+			child = node.children.get(name)
+			if child is None:
+				child = ScopeNode(name, node)
+				node.children[child.name] = child
+				self._nodes[child.qname] = child
+			node = child
+		return node
+
+	def path(self, qname):
+		"""
+		Returns the scope nodes of each component of `qname`. The nodes are
+		added to the scope tree if the name is not in the registry.
+		"""
+		return self._node(qname).path
+
+	def resolve(self, name, scope=None):
+		"""
+		Returns the references of the items called `name`.
+
+		Like an unqualified C++ name, `name` is looked up in the `scope`
+		qualified name, then each of its enclosing scopes, and then the global
+		scope, so a name in the scope hides a global name.
+		"""
+		node = self._nodes.get(scope) if scope else None
+		while node and node.qname:
+			try:
+				return self['{0}::{1}'.format(node.qname, name)]
+			except KeyError:
+				node = node.parent
+		return self[name]
+
+	def contents(self, qname):
+		"""
+		Yields the (qname, refs) pairs of the registered names inside the
+		`qname` scope, in the order they were registered.
+		"""
+		node = self._nodes.get(qname)
+		if not node:
+			return
+		stack = list(reversed(list(node.children.values())))
+		while len(stack) > 0:
+			node = stack.pop()
+			if node.refs:
+				yield node.qname, node.refs
+			stack.extend(reversed(list(node.children.values())))
+
+	def overloads(self, qname):
+		"""
+		Returns a map from the sorted argument names of the items called `qname`
+		to the items with those argument names.
+
+		The map is cached until `changed` is called.
+		"""
+		try:
+			return self._overloads[qname]
+		except KeyError:
+			pass
+		overloads = {}
+		for ref in self[qname]:
+			args = tuple(sorted([arg.name for arg in getattr(ref.item, 'args', [])]))
+			overloads.setdefault(args, []).append(ref.item)
+		self._overloads[qname] = overloads
+		return overloads
+
+	def changed(self):
+		self._overloads.clear()
+
+	def __missing__(self, qname):
+		scope = qname.split('::')
+		for n in range(len(scope) - 1, 0, -1):
+			materialize('::'.join(scope[0:n]))
+		for n in range(len(scope), 0, -1):
+			materialize_hidden('::'.join(scope[0:n]))
+		if dict.__contains__(self, qname):
+			return dict.__getitem__(self, qname)
+		raise KeyError(qname)
+
+
+_items = ItemRegistry()
+
+
+def _build_signature(item, scope):
 	ret = []
 	if isinstance(item, Variable) or isinstance(item, Function):
 		if item.kind == 'typedef':
@@ -101,7 +268,7 @@ def signature(item, scope):
 			ret.append(sref[0])
 			ret.append(cpplex.Operator('::'))
 		else:
-			ret.extend(cpplex.tokenize(name))
+			ret.extend(cpplex.cached_tokenize(name))
 	if isinstance(item, FunctionPointer):
 		ret.append(cpplex.Operator(')'))
 	if isinstance(item, Function):
@@ -117,7 +284,77 @@ def signature(item, scope):
 	return ret
 
 
-class ItemRef:
+class SignatureCache:
+	"""
+	Caches the signature tokens and HTML of an item when it is shown in a given
+	scope.
+
+	The signature depends on the items that the scope names resolve to, so the
+	cache is cleared whenever items are added to or removed from the model.
+
+	If `size` is not None, the least recently used signatures are removed to
+	keep at most `size` signatures in the cache.
+	"""
+
+	def __init__(self, size=None):
+		self.size = size
+		self._signatures = OrderedDict()
+
+	def __len__(self):
+		return len(self._signatures)
+
+	def _get(self, item, scope):
+		try:
+			entry = self._signatures.pop((item, scope))
+		except KeyError:
+			return None, None
+		self._signatures[(item, scope)] = entry
+		return entry
+
+	def _set(self, item, scope, tokens, html):
+		if self.size is not None and not (item, scope) in self._signatures:
+			while len(self._signatures) >= max(self.size, 1):
+				self._signatures.popitem(last=False)
+		self._signatures[(item, scope)] = (tokens, html)
+
+	def tokens(self, item, scope):
+		tokens, _ = self._get(item, scope)
+		if tokens is None:
+			tokens = tuple(_build_signature(item, scope))
+			self._set(item, scope, tokens, None)
+		return tokens
+
+	def html(self, item, scope):
+		tokens, html = self._get(item, scope)
+		if html is None:
+			if tokens is None:
+				tokens = tuple(_build_signature(item, scope))
+			html = cpplex.render_html(tokens)
+			self._set(item, scope, tokens, html)
+		return html
+
+	def clear(self):
+		self._signatures.clear()
+
+
+_signatures = SignatureCache()
+
+
+def _model_changed():
+	# The cached signatures and overloads depend on the items in the model.
+	_signatures.clear()
+	_items.changed()
+
+
+def signature(item, scope):
+	return _signatures.tokens(item, scope)
+
+
+def signature_html(item, scope):
+	return _signatures.html(item, scope)
+
+
+class ItemRef(object):
 	def __init__(self, ref):
 		self.ref = ref
 		self.item = None
@@ -125,44 +362,128 @@ class ItemRef:
 	def __repr__(self):
 		return 'ItemRef({0} => {1})'.format(self.ref, repr(self.item))
 
+	def __reduce__(self):
+		# Only the refid is pickled, so an unpickled reference resolves to the
+		# registered reference with that id; see _parse_doxygen_model.
+		return (create_item_ref, (self.ref,))
+
 	@property
 	def html(self):
-		return '<a href="{0}.html">{1}</a>'.format(self.ref, self.item.name)
+		return '<a href="{0}.html">{1}</a>'.format(self.ref, cpplex.escape(self.item.name))
 
 
 _item_refs = {}
 def create_item_ref(ref):
-	if ref in _item_refs.keys():
+	if ref in _item_refs:
 		return _item_refs[ref]
 	ret = ItemRef(ref)
 	_item_refs[ref] = ret
 	return ret
 
 
-def create_item(ref, protection, kind, name):
+def create_item(ref, protection, kind, name, source=None):
+	_model_changed()
 	if kind in ['variable', 'typedef']:
 		ref.item = Variable(protection, kind, name)
 	elif kind == 'function':
 		ref.item = Function(protection, kind, name)
 	else:
 		ref.item = Item(protection, kind, name)
-	if not name in _items.keys():
+	ref.item.source = source
+	if not name in _items:
 		_items[name] = []
 	_items[name].append(ref)
 
 
-_file_cache = {}
+class SourceFile:
+	"""
+	A memory-mapped source file that provides access to individual lines.
+
+	The line start offsets are indexed on demand, so only the lines up to the
+	one being accessed are scanned, and only that line is decoded. Lines are
+	indexed from 0, with negative indices counting from the end of the file,
+	as with the list returned by `text.split('\\n')`. The lines do not include
+	the line ending, which can be either `\\n` or `\\r\\n`.
+	"""
+
+	def __init__(self, filename):
+		self.filename = filename
+		self._file = open(filename, 'rb')
+		try:
+			self._data = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+		except ValueError: # empty files cannot be mapped
+			self._data = b''
+		self._offsets = array('I', [0])
+		self._indexed = False
+
+	def _index(self, lineno):
+		while not self._indexed and lineno >= len(self._offsets) - 1:
+			pos = self._data.find(b'\n', self._offsets[-1])
+			if pos == -1:
+				self._offsets.append(len(self._data) + 1)
+				self._indexed = True
+			else:
+				self._offsets.append(pos + 1)
+
+	def __len__(self):
+		self._index(sys.maxsize)
+		return len(self._offsets) - 1
+
+	def __getitem__(self, lineno):
+		if lineno < 0:
+			lineno = lineno + len(self)
+		else:
+			self._index(lineno)
+		if lineno < 0 or lineno >= len(self._offsets) - 1:
+			raise IndexError('line {0} not found in {1}'.format(lineno, self.filename))
+		line = self._data[self._offsets[lineno]:self._offsets[lineno + 1] - 1]
+		if line.endswith(b'\r'):
+			line = line[:-1]
+		return line.decode('utf-8')
+
+	def close(self):
+		if not isinstance(self._data, bytes):
+			self._data.close()
+		self._file.close()
+
+
+class SourceFileCache:
+	"""
+	Keeps the most recently used source files open, up to a maximum of `size`
+	files, closing the least recently used file when that limit is reached.
+	"""
+
+	def __init__(self, size=32):
+		self.size = size
+		self._files = OrderedDict()
+
+	def __getitem__(self, filename):
+		try:
+			source = self._files.pop(filename)
+		except KeyError:
+			source = SourceFile(filename)
+			while len(self._files) >= max(self.size, 1):
+				_, evicted = self._files.popitem(last=False)
+				evicted.close()
+		self._files[filename] = source
+		return source
+
+	def clear(self):
+		for source in self._files.values():
+			source.close()
+		self._files.clear()
+
+
+_source_files = SourceFileCache()
 def is_enum_class(xml):
 	# FIXME: Make 'enum class' detection more robust
 	filename = xml['@file']
 	line = int(xml['@line'])
-	if not filename in _file_cache.keys():
-		with open(filename) as f:
-			_file_cache[filename] = f.read().split('\n')
-	tokens = [x for x in list(cpplex.tokenize(_file_cache[filename][line - 2])) if not isinstance(x, cpplex.WhiteSpace)]
-	if tokens[0].value != 'enum':
+	tokens = cpplex.tokenize_stream(_source_files[filename][line - 2])
+	values = [tokens.value(i) for i in range(len(tokens)) if tokens.token_type(i) != cpplex.WhiteSpace]
+	if values[0] != 'enum':
 		raise Exception('Expected an enum declaration.')
-	return tokens[1].value == 'class'
+	return values[1] == 'class'
 
 
 def is_function_pointer(vartype):
@@ -175,19 +496,24 @@ def _parse_type_node(xml):
 	ret = []
 	for child in xml.children():
 		if child.name == '#text':
-			ret.extend(list(cpplex.tokenize(child.node.nodeValue)))
+			ret.extend(cpplex.cached_tokenize(child.value))
 		elif child.name == 'ref':
 			xref = create_item_ref(child['@refid'])
 			ret.append(xref)
 	return ret
 
 
-def _parse_memberdef_node(xml, parent):
-	ref = create_item_ref(xml['@id'])
+def _memberdef_qname(xml, parent):
 	name = '::'.join([parent.item.qname, xml['name/text()']])
 	if '<' in name and '>' in name: # template specialization
 		name = name.split('<')[0]
-	create_item(ref, xml['@prot'], xml['@kind'], name)
+	return name
+
+
+def _parse_memberdef_node(xml, parent):
+	ref = create_item_ref(xml['@id'])
+	name = _memberdef_qname(xml, parent)
+	create_item(ref, xml['@prot'], xml['@kind'], name, parent.item.source)
 	parent.item.children.append(ref)
 	# doxygen does not indicate if an enum is a C++11 scoped enum
 	if ref.item.kind == 'enum' and is_enum_class(xml['location']):
@@ -200,6 +526,7 @@ def _parse_memberdef_node(xml, parent):
 				item = ref.item
 				ref.item = FunctionPointer(ref.item.protection, ref.item.kind, ref.item.name)
 				ref.item.vartype = item.vartype[0:-2]
+				ref.item.source = item.source
 		elif child.name == 'param':
 			argnum = argnum + 1
 			pname = child['declname/text()']
@@ -208,7 +535,7 @@ def _parse_memberdef_node(xml, parent):
 				pname = '__arg{0}'.format(argnum)
 			p = Variable('public', 'parameter', pname)
 			p.vartype = ptype
-			ref.item.args.append(p)
+			ref.item.add_arg(p)
 		elif child.name == 'argsstring':
 			args = _parse_type_node(child)
 		elif child.name == 'enumvalue':
@@ -217,7 +544,7 @@ def _parse_memberdef_node(xml, parent):
 				vname = '::'.join([name, child['name/text()']])
 			else:
 				vname = '::'.join([parent.item.qname, child['name/text()']])
-			create_item(vref, child['@prot'], 'enumvalue', vname)
+			create_item(vref, child['@prot'], 'enumvalue', vname, parent.item.source)
 			ref.item.children.append(vref)
 	if isinstance(ref.item, FunctionPointer) and len(ref.item.args) == 0 and len(args) != 0:
 		# doxygen does not parse function pointer arguments into param items,
@@ -241,7 +568,7 @@ def _parse_memberdef_node(xml, parent):
 					param = param[:-1]
 				p = Variable('public', 'parameter', pname)
 				p.vartype = param
-				ref.item.args.append(p)
+				ref.item.add_arg(p)
 				param = []
 			elif len(param) == 0 and isinstance(token, cpplex.WhiteSpace):
 				pass
@@ -255,160 +582,1069 @@ def _parse_sectiondef_node(xml, parent):
 			_parse_memberdef_node(child, parent)
 
 
-def _parse_compounddef_node(xml):
-	if xml['@kind'] in ['file', 'dir', 'page']:
+# The memberdef nodes of lazily parsed compounds that have not been built yet,
+# keyed by the qualified name of the compound.
+_deferred_members = {}
+
+# The memberdef nodes of the non-public members of lazily parsed compounds,
+# keyed by the qualified name of the member. These are only built when that
+# name is looked up, such as when the member is documented.
+_hidden_members = {}
+
+
+def _is_public(xml):
+	return (xml['@prot'] or 'public') == 'public'
+
+
+def _defer_memberdef_nodes(xml, parent):
+	# Only the underlying XML elements of the members are kept, so the wrappers
+	# of the compound's nodes can be freed once it has been parsed.
+	members = []
+	for section in xml.elements('sectiondef'):
+		for member in section.elements('memberdef'):
+			if _is_public(member):
+				members.append((type(member), member.node, parent))
+			else:
+				qname = _memberdef_qname(member, parent)
+				_hidden_members.setdefault(qname, []).append((type(member), member.node, parent))
+	if len(members) > 0:
+		_deferred_members.setdefault(parent.item.qname, []).extend(members)
+
+
+def materialize(qname):
+	"""
+	Build the deferred public members of the compounds called `qname`.
+	"""
+	deferred = _deferred_members.pop(qname, None)
+	if not deferred:
+		return
+	for node_type, node, parent in deferred:
+		_parse_memberdef_node(node_type(node), parent)
+
+
+def materialize_all():
+	for qname in list(_deferred_members.keys()):
+		materialize(qname)
+
+
+def materialize_hidden(qname):
+	"""
+	Build the deferred non-public members called `qname`.
+	"""
+	for node_type, node, parent in _hidden_members.pop(qname, []):
+		_parse_memberdef_node(node_type(node), parent)
+
+
+# The compounds that do not describe the API, and the doxygen XML nodes that are
+# not used to build the API model. These are skipped when parsing the XML.
+_ignored_compound_kinds = ['file', 'dir', 'page']
+_ignored_nodes = ['programlisting', 'detaileddescription', 'inbodydescription', 'references', 'referencedby']
+
+
+def _is_api_compound(xml):
+	return xml.name == 'compounddef' and xml['@kind'] not in _ignored_compound_kinds
+
+
+def _parse_compounddef_node(xml, lazy=False, source=None):
+	if not _is_api_compound(xml):
 		return None
 	ref = create_item_ref(xml['@id'])
 	for child in xml:
 		if child.name == 'compoundname':
-			create_item(ref, xml['@prot'], xml['@kind'], child['text()'])
-		elif child.name == 'sectiondef':
+			create_item(ref, xml['@prot'], xml['@kind'], child['text()'], source)
+		elif child.name == 'sectiondef' and not lazy:
 			_parse_sectiondef_node(child, ref)
+	if lazy:
+		_defer_memberdef_nodes(xml, ref)
 	return ref
 
 
-def parse_doxygen(filename):
-	xml = xmlapi.XmlDocument(filename)
-	item = None
+def iter_doxygen(filename, lazy=False):
+	"""
+	Parse each API compound in a doxygen XML file, yielding the reference to
+	each compound once it has been parsed.
+
+	The file is read in a single streaming pass, so this supports both the
+	per-compound XML files and combined files like the `all.xml` generated by
+	doxygen's `combine.xslt`, without holding the whole document in memory.
+
+	If `lazy` is True, the public members of each compound are not built until
+	they are needed (see `materialize`), and the non-public members are only
+	built if they are looked up by name (see `materialize_hidden`).
+	"""
+	compound = xmlapi.start_tag(filename, 'compounddef')
+	if compound is None:
+		return
+	if compound.get('id') == os.path.splitext(os.path.basename(filename))[0] and compound.get('kind') in _ignored_compound_kinds:
+		# doxygen writes each compound to a file named after its id, so the
+		# rest of the file only contains that compound.
+		return
+	xml = xmlapi.ElementTreeDocument(filename, accept=_is_api_compound, discard=_ignored_nodes)
 	for child in xml:
-		if child.name == 'compounddef':
-			if item:
-				raise Exception('Multiple compounddef nodes found.')
-			item = _parse_compounddef_node(child)
+		yield _parse_compounddef_node(child, lazy, filename)
+
+
+def parse_doxygen(filename, lazy=False):
+	item = None
+	for ref in iter_doxygen(filename, lazy):
+		if item:
+			raise Exception('Multiple compounddef nodes found.')
+		item = ref
 	return item
 
 
-if __name__ == '__main__':
-	def escape(text):
-		return text.encode('utf-8').replace('&', '&amp;').replace('<', '&lt;').replace('>', '&gt;')
+# The module variables holding the model built by `_parse_doxygen_model`.
+_model_variables = ['_items', '_item_refs', '_deferred_members', '_hidden_members']
 
 
-	def print_etree(e, f=sys.stdout, terminator='\n', scope=None, inline=False):
-		if e.tag == 'a' and 'href' in e.attrib.keys() and e.attrib['href'].startswith('^^'):
-			name = e.attrib['href'].replace('^^', '')
-			try:
-				ref = _items[name][0]
-				if e.text == '':
-					n = ref.item.qname
-					f.write('<a href="{0}.html">{1}</a>'.format(ref.ref, escape(n)))
-				else:
-					f.write('<a href="{0}.html">{1}</a>'.format(ref.ref, escape(e.text)))
-			except KeyError:
-				sys.stderr.write('error: cross reference {0} not found\n'.format(name))
-				f.write('{0}'.format(escape(name)))
-			if e.tail != None:
-				f.write('{0}'.format(escape(e.tail)))
+def _parse_doxygen_model(args):
+	"""
+	Parse a doxygen XML file in a worker process, returning a picklable model of
+	the items it defines.
+
+	The model contains the refids of the compounds in the file, the (refid,
+	item) pairs of the items defined in the file and the (qname, refid) pairs
+	of the names registered in `_items`. Item references are pickled as their
+	refid, so references to items defined in other files are resolved when the
+	model is merged by `_merge_doxygen_model`.
+	"""
+	filename, lazy = args
+	# The file is parsed into empty registries, which replace the registries of
+	# the active session until the model has been built.
+	module = globals()
+	saved = dict([(name, module[name]) for name in _model_variables])
+	module.update({'_items': ItemRegistry(), '_item_refs': {}, '_deferred_members': {}, '_hidden_members': {}})
+	try:
+		compounds = [ref.ref for ref in iter_doxygen(filename, lazy) if ref]
+		# The XML elements cannot be pickled, so the deferred members are built
+		# here, including the non-public members that could be documented.
+		materialize_all()
+		for qname in list(_hidden_members.keys()):
+			materialize_hidden(qname)
+		definitions = [(ref.ref, ref.item) for ref in _item_refs.values() if ref.item]
+		names = [(qname, ref.ref) for qname, refs in _items.items() for ref in refs]
+		return compounds, definitions, names
+	finally:
+		module.update(saved)
+
+
+def _merge_doxygen_model(model):
+	compounds, definitions, names = model
+	_model_changed()
+	for refid, item in definitions:
+		create_item_ref(refid).item = item
+	for qname, refid in names:
+		if not qname in _items:
+			_items[qname] = []
+		_items[qname].append(create_item_ref(refid))
+	return [create_item_ref(refid) for refid in compounds]
+
+
+class ModelCache:
+	"""
+	Stores the models returned by `_parse_doxygen_model` on disk, so a doxygen
+	XML file does not need to be parsed again if it has not changed.
+
+	Each XML file has one cache entry, keyed by the content hash of the file
+	and the version of the documentation generator. An entry is ignored if the
+	file or the generator has changed, or if the entry cannot be read.
+	"""
+
+	def __init__(self, directory):
+		self.directory = directory
+		self.hits = 0
+		self.misses = 0
+		self._version = None
+
+	def _entry(self, filename, lazy):
+		name = '{0} {1} {2}'.format(os.path.abspath(filename), lazy, __name__)
+		return os.path.join(self.directory, '{0}.pickle'.format(hashlib.sha1(name.encode('utf-8')).hexdigest()))
+
+	def _key(self, filename):
+		if not self._version:
+			self._version = '{0} {1}'.format(tool_version(), sys.version_info[0])
+		return '{0} {1}'.format(self._version, file_hash(filename))
+
+	def load(self, filename, lazy=False):
+		"""
+		Returns the cached model of `filename`, or None if it is not cached.
+		"""
+		try:
+			with open(self._entry(filename, lazy), 'rb') as f:
+				if pickle.load(f) == self._key(filename):
+					self.hits = self.hits + 1
+					return pickle.load(f)
+		except Exception:
+			pass
+		self.misses = self.misses + 1
+		return None
+
+	def save(self, filename, lazy, model):
+		if not os.path.exists(self.directory):
+			os.makedirs(self.directory)
+		def write(f):
+			pickle.dump(self._key(filename), f, pickle.HIGHEST_PROTOCOL)
+			pickle.dump(model, f, pickle.HIGHEST_PROTOCOL)
+		write_file_atomic(self._entry(filename, lazy), write, 'wb')
+
+
+def parse_doxygen_files(filenames, lazy=False, jobs=1, cache=None):
+	"""
+	Parse the doxygen XML files, returning the references to their compounds.
+
+	If `jobs` is greater than 1, the files are parsed in a pool of that many
+	processes. The models returned by each process are merged in the order of
+	`filenames`, so the result is the same as parsing the files in turn. In lazy
+	mode, each process builds the public members of the compounds it parses.
+
+	If `cache` is a `ModelCache`, the models of the files that have not changed
+	are read from the cache instead of parsing the files.
+	"""
+	if jobs <= 1 and not cache:
+		items = []
+		for filename in filenames:
+			for item in iter_doxygen(filename, lazy):
+				if item:
+					items.append(item)
+		return items
+	items = []
+	for filename, model in _parse_doxygen_models(filenames, lazy, jobs, cache):
+		items.extend(_merge_doxygen_model(model))
+	return items
+
+
+def _parse_doxygen_models(filenames, lazy=False, jobs=1, cache=None):
+	models = [cache.load(filename, lazy) if cache else None for filename in filenames]
+	missing = [(filename, lazy) for filename, model in zip(filenames, models) if model is None]
+	pool = multiprocessing.Pool(jobs) if jobs > 1 and len(missing) > 0 else None
+	try:
+		if pool:
+			parsed = pool.imap(_parse_doxygen_model, missing)
+		else:
+			# Pickling the model resolves its item references in the same way
+			# as a model returned from a worker process.
+			parsed = (pickle.loads(pickle.dumps(_parse_doxygen_model(args), pickle.HIGHEST_PROTOCOL)) for args in missing)
+		for filename, model in zip(filenames, models):
+			if model is None:
+				model = next(parsed)
+				if cache:
+					cache.save(filename, lazy, model)
+			yield filename, model
+	finally:
+		if pool:
+			pool.close()
+			pool.join()
+
+
+# The number of seconds between checking the input files for changes when
+# watching them.
+_watch_interval = 0.25
+
+
+class InputFiles:
+	"""
+	The doxygen XML and markdown files that the model is built from.
+
+	This records the items that each file defines or documents, so the files
+	that have changed can be parsed again without rebuilding the rest of the
+	model.
+	"""
+
+	def __init__(self, filenames, lazy=False, jobs=1, cache=None):
+		self.filenames = [f for f in filenames if f.endswith('.xml') or f.endswith('.md')]
+		self.lazy = lazy
+		self.cache = cache
+		self.compounds = OrderedDict()
+		self.definitions = {}
+		self.names = {}
+		self.documented = OrderedDict()
+		self.mtimes = {}
+		self.hashes = {}
+		for filename in self.filenames:
+			self.mtimes[filename] = self._mtime(filename)
+		xml = [f for f in self.filenames if f.endswith('.xml')]
+		for filename, model in _parse_doxygen_models(xml, lazy, jobs, cache):
+			self._add_model(filename, model)
+		self._bind([f for f in self.filenames if f.endswith('.md')])
+
+	def _mtime(self, filename):
+		try:
+			return os.stat(filename).st_mtime
+		except OSError:
+			return None
+
+	def items(self):
+		"""
+		Returns the references to the compounds, in the order of the XML files.
+		"""
+		return [ref for refs in self.compounds.values() for ref in refs]
+
+	def inputs(self):
+		"""
+		Returns the (filename, hash) pairs of the input files.
+		"""
+		for filename in self.filenames:
+			if not filename in self.hashes:
+				self.hashes[filename] = file_hash(filename)
+		return [(filename, self.hashes[filename]) for filename in self.filenames]
+
+	def changed(self):
+		"""
+		Returns the input files that have been modified since they were last
+		checked.
+		"""
+		ret = []
+		for filename in self.filenames:
+			mtime = self._mtime(filename)
+			if mtime and mtime != self.mtimes[filename]:
+				self.mtimes[filename] = mtime
+				self.hashes.pop(filename, None)
+				ret.append(filename)
+		return ret
+
+	def reload(self, filenames):
+		"""
+		Parse the changed files again, returning the qualified names of the
+		items whose documentation was bound again.
+
+		The XML files are parsed before the model is modified, so the model is
+		left unchanged if one of them cannot be parsed.
+		"""
+		xml = [f for f in filenames if f.endswith('.xml')]
+		models = list(_parse_doxygen_models(xml, self.lazy, 1, self.cache))
+		# The items in the XML files are replaced, so the markdown files that
+		# document those items need to be bound again.
+		markdown = set([f for f in filenames if f.endswith('.md')])
+		for filename, items in self.documented.items():
+			if any([item.source in xml for item in items]):
+				markdown.add(filename)
+		for filename, model in models:
+			self._remove_model(filename)
+			self._add_model(filename, model)
+		return self._rebind(markdown)
+
+	def _add_model(self, filename, model):
+		compounds, definitions, names = model
+		self.definitions[filename] = [refid for refid, _ in definitions]
+		self.names[filename] = names
+		self.compounds[filename] = _merge_doxygen_model(model)
+
+	def _remove_model(self, filename):
+		_model_changed()
+		for qname, refid in self.names.pop(filename, []):
+			refs = dict.get(_items, qname, [])
+			ref = create_item_ref(refid)
+			if ref in refs:
+				refs.remove(ref)
+			if len(refs) == 0 and qname in _items:
+				del _items[qname]
+		for refid in self.definitions.pop(filename, []):
+			create_item_ref(refid).item = None
+
+	def _bind(self, filenames):
+		for filename in self.filenames:
+			if filename in filenames:
+				self.documented[filename] = docs.parse(filename, _items)
+				for item in self.documented[filename]:
+					item.docs_source = filename
+
+	def _documenting(self, filenames):
+		qnames = set([item.qname for filename in filenames for item in self.documented.get(filename, [])])
+		return set([filename for filename, items in self.documented.items() if any([item.qname in qnames for item in items])])
+
+	def _rebind(self, filenames):
+		# The documentation in a markdown file replaces the documentation of
+		# the same item in the markdown files before it, so the files that
+		# document the same items are bound again in order.
+		filenames = set(filenames)
+		qnames = set()
+		while True:
+			while not self._documenting(filenames) <= filenames:
+				filenames |= self._documenting(filenames)
+			for filename in filenames:
+				qnames.update([item.qname for item in self.documented.get(filename, [])])
+				docs.retract(self.documented.get(filename, []))
+			self._bind(filenames)
+			if self._documenting(filenames) <= filenames:
+				for filename in filenames:
+					qnames.update([item.qname for item in self.documented[filename]])
+				return qnames
+
+
+def fork_pool(jobs):
+	"""
+	Create a pool of worker processes that are forked from this process, so
+	they share the model built by this process without it being pickled.
+
+	Returns None if the platform does not support forking processes.
+	"""
+	if not hasattr(os, 'fork'):
+		return None
+	try:
+		return multiprocessing.get_context('fork').Pool(jobs)
+	except AttributeError: # Python 2 always forks the worker processes
+		return multiprocessing.Pool(jobs)
+
+
+def write_file_atomic(filename, write, mode='w'):
+	"""
+	Write a file by calling `write` with a temporary file, then renaming the
+	temporary file to `filename` once it has been written.
+	"""
+	temp = '{0}.{1}.tmp'.format(filename, os.getpid())
+	try:
+		with open(temp, mode) as f:
+			write(f)
+		try:
+			os.replace(temp, filename)
+		except AttributeError: # Python 2
+			if os.path.exists(filename) and sys.platform == 'win32':
+				os.remove(filename)
+			os.rename(temp, filename)
+	except:
+		if os.path.exists(temp):
+			os.remove(temp)
+		raise
+
+
+def _xref_targets(e):
+	for a in e.iter('a'):
+		href = a.attrib.get('href', '')
+		if href.startswith('^^'):
+			yield href.replace('^^', '')
+
+
+def _etree_text(e, out):
+	out.append('<{0}{1}>'.format(e.tag, sorted(e.attrib.items())))
+	out.append(e.text or '')
+	for child in e:
+		_etree_text(child, out)
+	out.append('</{0}>'.format(e.tag))
+	out.append(e.tail or '')
+
+
+def _docs_text(doc, out):
+	if not doc:
+		return
+	for e in [doc.brief] + doc.detailed:
+		if e is not None:
+			_etree_text(e, out)
+
+
+def item_fingerprint(item, scope):
+	"""
+	Returns a hash of the signature and documentation of `item` when it is
+	shown in `scope`.
+	"""
+	out = [item.kind, item.protection, item.qname, signature_html(item, scope)]
+	_docs_text(item.docs, out)
+	if isinstance(item, Function):
+		out.append('returns')
+		_docs_text(item.retdoc, out)
+		for arg in item.args:
+			out.append(arg.name)
+			_docs_text(arg.docs, out)
+	text = '\n'.join([x.decode('utf-8') if isinstance(x, bytes) else x for x in out])
+	return hashlib.sha1(text.encode('utf-8')).hexdigest()
+
+
+def page_dependencies(ref):
+	"""
+	Returns the input files and items that the page for `ref` depends on.
+
+	The items are a map from the refid of each item shown on the page to its
+	`item_fingerprint`, and from each cross-reference on the page to the item
+	it links to, or None if it is unresolved. The files are the input files
+	that define or document the items shown or linked to on the page.
+
+	This follows the items that `generate_html` renders on the page.
+	"""
+	files = set()
+	dependencies = {}
+
+	def add_docs(doc, scope):
+		if not doc:
 			return
-		if not inline:
-			args=''.join([' {0}="{1}"'.format(x, y) for x, y in e.attrib.items()])
-			f.write('<{0}{1}>'.format(e.tag, args))
-		if e.text != None:
-			f.write('{0}'.format(escape(e.text)))
-		for child in e:
-			print_etree(child, f=f, terminator='', scope=scope)
-		if not inline:
-			f.write('</{0}>{1}'.format(e.tag, terminator))
-		if e.tail != None and e.tail.strip() != '':
-			f.write('{0}'.format(escape(e.tail)))
-
-
-	def generate_html(f, ref, scope=None, recurse_children=True):
-		f.write('<p><code>')
+		for e in [doc.brief] + doc.detailed:
+			if e is None:
+				continue
+			for name in _xref_targets(e):
+				try:
+					target = _items.resolve(name, scope.qname)[0]
+					files.add(target.item.source)
+					target = '{0} {1}'.format(target.ref, target.item.qname)
+				except KeyError:
+					target = None
+				dependencies['^^{0} {1}'.format(scope.qname, name)] = target
+
+	def add_item(ref, scope, docs_scope):
+		dependencies[ref.ref] = item_fingerprint(ref.item, scope)
+		files.add(ref.item.source)
+		files.add(ref.item.docs_source)
 		for token in signature(ref.item, scope):
-			f.write(token.html)
-		f.write('</code></p>\n')
-		if ref.item.docs and ref.item.docs.brief != None:
-			print_etree(ref.item.docs.brief, f, scope=ref.item)
-			if isinstance(ref.item, Function) and len(ref.item.args) > 0:
-				f.write('<table class="parameters">\n')
-				for arg in ref.item.args:
-					f.write('<tr>\n')
-					f.write('<td><code><span class="identifier">{0}</span></code></td>\n'.format(arg.name))
-					f.write('<td>\n')
-					if arg.docs and arg.docs.brief != None:
-						if len(arg.docs.detailed) == 0:
-							print_etree(arg.docs.brief, f, scope=ref.item, inline=True)
-						else:
-							print_etree(arg.docs.brief, f, scope=ref.item)
-							for doc in arg.docs.detailed:
-								print_etree(doc, f, scope=ref.item)
-					f.write('</td>\n')
-					f.write('</tr>\n')
-				f.write('</table>\n')
-			for doc in ref.item.docs.detailed:
-				print_etree(doc, f, scope=ref.item)
-			if isinstance(ref.item, Function) and ref.item.retdoc and ref.item.retdoc.brief != None:
-				f.write('<dl>\n')
-				f.write('<dt class="return">Returns:</dt>\n')
-				f.write('<dd>\n')
-				print_etree(ref.item.retdoc.brief, f, scope=ref.item)
-				for doc in ref.item.retdoc.detailed:
-					print_etree(doc, f, scope=ref.item)
-				f.write('</dd>\n')
-				f.write('</dl>\n')
-		if len(ref.item.children) > 0:
-			if ref.item.kind in ['enum', 'enumclass']:
-				f.write('<table class="enumeration">\n')
-				for child in ref.item.children:
-					f.write('<tr>\n')
-					f.write('<td><code><span class="identifier">{0}</span></code></td>\n'.format(child.item.name))
-					f.write('<td>\n')
-					if child.item.docs and child.item.docs.brief != None:
-						if len(child.item.docs.detailed) == 0:
-							print_etree(child.item.docs.brief, f, scope=ref.item, inline=True)
-						else:
-							print_etree(child.item.docs.brief, f, scope=ref.item)
-							for doc in child.item.docs.detailed:
-								print_etree(doc, f, scope=ref.item)
-					f.write('</td>\n')
-					f.write('</tr>\n')
-				f.write('</table>\n')
-			elif recurse_children:
-				for child in ref.item.children:
-					if child.item.protection == 'public':
-						generate_html(f, child, scope=ref.item, recurse_children=False)
+			if isinstance(token, ItemRef) and token.item:
+				files.add(token.item.source)
+		add_docs(ref.item.docs, docs_scope)
+		if isinstance(ref.item, Function):
+			add_docs(ref.item.retdoc, docs_scope)
+			for arg in ref.item.args:
+				add_docs(arg.docs, docs_scope)
 
-	items = []
-	for filename in sys.argv[1:]:
-		if filename.endswith('.xml'):
-			item = parse_doxygen(filename)
-			if item:
-				items.append(item)
-	for filename in sys.argv[1:]:
-		if filename.endswith('.md'):
-			docs.parse(filename, _items)
-
-	for qname, refs in sorted(_items.items()):
-		for ref in refs:
+	def add_page_item(ref, scope, recurse_children):
+		add_item(ref, scope, ref.item)
+		materialize(ref.item.qname)
+		if ref.item.kind in ['enum', 'enumclass']:
+			for child in ref.item.children:
+				add_item(child, ref.item, ref.item)
+		elif recurse_children:
+			for child in ref.item.children:
+				if child.item.protection == 'public':
+					add_page_item(child, ref.item, False)
+
+	add_page_item(ref, None, True)
+	files.discard(None)
+	return files, dependencies
+
+
+def _scope_names(scope, name):
+	# The qualified names that `name` can resolve to in `scope`; see resolve.
+	names = [name]
+	scope = scope.split('::') if scope else []
+	for n in range(1, len(scope) + 1):
+		names.append('::'.join(scope[0:n] + [name]))
+	return names
+
+
+def file_hash(filename):
+	h = hashlib.sha1()
+	with open(filename, 'rb') as f:
+		for block in iter(lambda: f.read(65536), b''):
+			h.update(block)
+	return h.hexdigest()
+
+
+def tool_version():
+	"""
+	Returns a hash of the documentation generator's source code, so the output
+	of a previous build is not reused after the generator has changed.
+	"""
+	h = hashlib.sha1()
+	for module in [sys.modules[__name__], cpplex, xmlapi, docs]:
+		with open(os.path.splitext(module.__file__)[0] + '.py', 'rb') as f:
+			h.update(f.read())
+	return h.hexdigest()
+
+
+class BuildManifest:
+	"""
+	Records the inputs of a build, and the items that each page was generated
+	from, so a later build only regenerates the pages whose items have changed.
+
+	Nothing needs to be parsed or generated if none of the input files have
+	changed. All pages are regenerated if the generator or the list of input
+	files has changed.
+	"""
+
+	def __init__(self, filename):
+		self.filename = filename
+		try:
+			with open(filename) as f:
+				data = json.load(f)
+		except (IOError, OSError, ValueError):
+			data = {}
+		self.version = data.get('version')
+		self.inputs = data.get('inputs', {})
+		self.order = data.get('order', [])
+		self.pages = data.get('pages', {})
+		self.changed = set()
+		self._pages = {}
+		self._rebuild = True
+
+	def begin(self, version, inputs):
+		"""
+		Start a build with the given generator version and list of (filename,
+		hash) inputs.
+		"""
+		order = [filename for filename, _ in inputs]
+		self._rebuild = self.version != version or self.order != order
+		self.changed = set([filename for filename, h in inputs if self.inputs.get(filename) != h])
+		self.version = version
+		self.inputs = dict(inputs)
+		self.order = order
+		self._pages = {}
+
+	def is_up_to_date(self, rootdir):
+		"""
+		Returns True if none of the inputs have changed since the previous
+		build, and the pages it wrote to `rootdir` still exist.
+		"""
+		if self._rebuild or len(self.changed) > 0:
+			return False
+		return all([os.path.exists(os.path.join(rootdir, '%s.html' % page)) for page in self.pages])
+
+	def is_affected(self, page, filename, refids, qnames):
+		"""
+		Returns True if the `page` written to `filename` may be affected by the
+		changed input files, where `refids` and `qnames` are the ids and names
+		of the items that the changed files define or document.
+
+		The pages that are not affected do not need their `page_dependencies`
+		to be checked.
+		"""
+		previous = self.pages.get(page)
+		if self._rebuild or previous is None or not os.path.exists(filename):
+			return True
+		if self.changed.intersection(previous['files']):
+			return True
+		for key, target in previous['items'].items():
+			if not key.startswith('^^'):
+				if key in refids:
+					return True
+				continue
+			if target is None or target.split(' ')[0] in refids:
+				return True
+			# A new item in a nearer scope would hide the linked item.
+			scope, name = key[2:].split(' ', 1)
+			if qnames.intersection(_scope_names(scope, name)):
+				return True
+		return False
+
+	def is_outdated(self, page, filename, dependencies):
+		"""
+		Returns True if the `page` written to `filename` needs to be generated
+		again, where `dependencies` are the current items of the page returned
+		by `page_dependencies`.
+		"""
+		previous = self.pages.get(page)
+		if self._rebuild or previous is None or not os.path.exists(filename):
+			return True
+		return previous['items'] != dependencies
+
+	def add_page(self, page, files, dependencies):
+		self._pages[page] = {'files': sorted(files), 'items': dependencies}
+
+	def keep_page(self, page):
+		"""
+		Keep the dependencies of a page that was not affected by the changes.
+		"""
+		self._pages[page] = self.pages[page]
+
+	def removed_pages(self):
+		"""
+		Returns the pages of the previous build that are not in this build.
+		"""
+		return [page for page in self.pages if not page in self._pages]
+
+	def save(self):
+		self.pages = self._pages
+		data = {
+			'version': self.version,
+			'inputs': self.inputs,
+			'order': self.order,
+			'pages': self.pages,
+		}
+		write_file_atomic(self.filename, lambda f: json.dump(data, f, indent=1, sort_keys=True))
+
+
+# The HTML fragments that the pages are assembled from. The pages are built
+# in a list of strings and written to the file in a single call.
+
+_page_start = '<!DOCTYPE html>\n<html>\n<head>\n<title>{0} documentation</title>\n<link rel="stylesheet" type="text/css" href="{1}">\n</head>\n<body>\n'.format
+_page_end = '</body>\n</html>\n'
+_signature = '<p><code>{0}</code></p>\n'.format
+_link = '<a href="{0}.html">{1}</a>'.format
+_attribute = ' {0}="{1}"'.format
+_start_tag = '<{0}{1}>'.format
+_end_tag = '</{0}>{1}'.format
+_row_start = '<tr>\n<td><code><span class="identifier">{0}</span></code></td>\n<td>\n'.format
+_row_end = '</td>\n</tr>\n'
+_parameters_start = '<table class="parameters">\n'
+_enumeration_start = '<table class="enumeration">\n'
+_table_end = '</table>\n'
+_returns_start = '<dl>\n<dt class="return">Returns:</dt>\n<dd>\n'
+_returns_end = '</dd>\n</dl>\n'
+
+_stylesheet_name = 'documentation.css'
+_stylesheet = '''table       { width: 100%; }
+table tr td { vertical-align: top; border-bottom: 1px solid #EEE; }
+table tr td * { margin-top: 0; }
+blockquote  { margin-top: 0; margin-bottom: 0; }
+.identifier { font-weight: normal; color: navy; }
+.keyword    { font-weight: bold;   color: green; }
+.operator   { font-weight: normal; color: black; }
+.literal    { font-weight: normal; color: magenta; }
+.return     { font-weight: bold;   color: black; }
+'''
+
+
+if sys.version_info[0] == 2:
+	def escape(text):
+		return cpplex.escape(text).encode('utf-8')
+else:
+	def escape(text):
+		return cpplex.escape(text)
+
+
+def print_etree(e, out, errors, terminator='\n', scope=None, inline=False):
+	if e.tag == 'a' and 'href' in e.attrib.keys() and e.attrib['href'].startswith('^^'):
+		name = e.attrib['href'].replace('^^', '')
+		try:
+			ref = _items.resolve(name, scope.qname if scope else None)[0]
+			if e.text == '':
+				out.append(_link(ref.ref, escape(ref.item.qname)))
+			else:
+				out.append(_link(ref.ref, escape(e.text)))
+		except KeyError:
+			errors.append('error: cross reference {0} not found\n'.format(name))
+			out.append(escape(name))
+		if e.tail != None:
+			out.append(escape(e.tail))
+		return
+	if not inline:
+		out.append(_start_tag(e.tag, ''.join([_attribute(x, y) for x, y in e.attrib.items()])))
+	if e.text != None:
+		out.append(escape(e.text))
+	for child in e:
+		print_etree(child, out, errors, terminator='', scope=scope)
+	if not inline:
+		out.append(_end_tag(e.tag, terminator))
+	if e.tail != None and e.tail.strip() != '':
+		out.append(escape(e.tail))
+
+
+def print_docs(documentation, out, errors, scope):
+	if len(documentation.detailed) == 0:
+		print_etree(documentation.brief, out, errors, scope=scope, inline=True)
+	else:
+		print_etree(documentation.brief, out, errors, scope=scope)
+		for doc in documentation.detailed:
+			print_etree(doc, out, errors, scope=scope)
+
+
+def generate_html(out, errors, ref, scope=None, recurse_children=True):
+	out.append(_signature(signature_html(ref.item, scope)))
+	if ref.item.docs and ref.item.docs.brief != None:
+		print_etree(ref.item.docs.brief, out, errors, scope=ref.item)
+		if isinstance(ref.item, Function) and len(ref.item.args) > 0:
+			out.append(_parameters_start)
+			for arg in ref.item.args:
+				out.append(_row_start(arg.name))
+				if arg.docs and arg.docs.brief != None:
+					print_docs(arg.docs, out, errors, ref.item)
+				out.append(_row_end)
+			out.append(_table_end)
+		for doc in ref.item.docs.detailed:
+			print_etree(doc, out, errors, scope=ref.item)
+		if isinstance(ref.item, Function) and ref.item.retdoc and ref.item.retdoc.brief != None:
+			out.append(_returns_start)
+			print_etree(ref.item.retdoc.brief, out, errors, scope=ref.item)
+			for doc in ref.item.retdoc.detailed:
+				print_etree(doc, out, errors, scope=ref.item)
+			out.append(_returns_end)
+	materialize(ref.item.qname)
+	if len(ref.item.children) > 0:
+		if ref.item.kind in ['enum', 'enumclass']:
+			out.append(_enumeration_start)
+			for child in ref.item.children:
+				out.append(_row_start(child.item.name))
+				if child.item.docs and child.item.docs.brief != None:
+					print_docs(child.item.docs, out, errors, ref.item)
+				out.append(_row_end)
+			out.append(_table_end)
+		elif recurse_children:
+			for child in ref.item.children:
+				if child.item.protection == 'public':
+					generate_html(out, errors, child, scope=ref.item, recurse_children=False)
+
+
+def page_html(item, errors):
+	"""
+	Return the html of the page documenting `item`. The errors found while
+	generating the page are added to the `errors` list.
+	"""
+	out = [_page_start(escape(item.item.qname), _stylesheet_name)]
+	generate_html(out, errors, item)
+	out.append(_page_end)
+	return ''.join(out)
+
+
+def write_html_file(filename, html):
+	if isinstance(html, bytes): # Python 2
+		write_file_atomic(filename, lambda f: f.write(html))
+	else:
+		write_file_atomic(filename, lambda f: f.write(html.encode('utf-8')), 'wb')
+
+
+# The pages and directory used by write_page. These are module variables so the
+# worker processes forked by write_pages share them.
+_pages = []
+_pages_dir = None
+
+
+def write_page(index):
+	# The messages written while generating the page are returned, so they
+	# are reported in page order when the pages are written in parallel.
+	item = _pages[index]
+	errors = []
+	write_html_file(os.path.join(_pages_dir, '%s.html' % item.ref), page_html(item, errors))
+	return ''.join(errors)
+
+
+def public_pages(items):
+	return [item for item in items if item.item and item.item.protection == 'public']
+
+
+def write_pages(items, rootdir, jobs=1, manifest=None):
+	"""
+	Write the pages of the public compounds in `items` to `rootdir`, returning
+	the number of pages written.
+
+	If `manifest` is a `BuildManifest` that a build has been started on, only
+	the pages whose items have changed are written, and the pages that are no
+	longer generated are removed.
+	"""
+	global _pages
+	global _pages_dir
+	_pages = public_pages(items)
+	_pages_dir = rootdir
+	try:
+		write_html_file(os.path.join(rootdir, _stylesheet_name), _stylesheet)
+		if manifest:
+			changed = [ref for ref in _item_refs.values() if ref.item and (ref.item.source in manifest.changed or ref.item.docs_source in manifest.changed)]
+			refids = set([ref.ref for ref in changed])
+			qnames = set([ref.item.qname for ref in changed])
+			outdated = []
+			for index, item in enumerate(_pages):
+				filename = os.path.join(rootdir, '%s.html' % item.ref)
+				if not manifest.is_affected(item.ref, filename, refids, qnames):
+					manifest.keep_page(item.ref)
+					continue
+				files, dependencies = page_dependencies(item)
+				if manifest.is_outdated(item.ref, filename, dependencies):
+					outdated.append(index)
+				manifest.add_page(item.ref, files, dependencies)
+		else:
+			outdated = list(range(len(_pages)))
+
+		pool = fork_pool(jobs) if jobs > 1 and len(outdated) > 1 else None
+		if pool:
+			try:
+				for messages in pool.imap(write_page, outdated):
+					sys.stderr.write(messages)
+			finally:
+				pool.close()
+				pool.join()
+		else:
+			for index in outdated:
+				sys.stderr.write(write_page(index))
+
+		if manifest:
+			for page in manifest.removed_pages():
+				filename = os.path.join(rootdir, '%s.html' % page)
+				if os.path.exists(filename):
+					os.remove(filename)
+			manifest.save()
+		return len(outdated)
+	finally:
+		# Release the pages so the model is not kept alive after the build.
+		_pages = []
+		_pages_dir = None
+
+
+def report_undocumented(qnames=None):
+	"""
+	Report the public items that are not documented, returning the number of
+	items reported. If `qnames` is given, only those items are checked.
+	"""
+	materialize_all()
+	if qnames is None:
+		qnames = _items.keys()
+	count = 0
+	for qname in sorted([qname for qname in qnames if qname in _items]):
+		for ref in _items[qname]:
 			if not ref.item.docs and ref.item.protection == 'public':
 				sys.stderr.write('error: item {0} is not documented\n'.format(qname))
+				count = count + 1
+	return count
 
-	rootdir = 'docs/api/html'
-	if not os.path.exists(rootdir):
-		os.mkdir(rootdir)
 
-	for item in items:
-		if not item.item or item.item.protection != 'public':
-			continue
+# The module variables holding the registries of the active session.
+_session_variables = ['_items', '_item_refs', '_deferred_members', '_hidden_members', '_source_files', '_signatures', '_names']
+
+
+class Session:
+	"""
+	Owns the registries and caches used to build the documentation, so the
+	documentation for several projects can be built in the same process, and
+	the memory used by a build is freed when it has finished.
+
+	The functions in this module use the registries of the active session. A
+	session is made active by using it in a `with` statement, which restores
+	the previously active session at the end of the statement.
+	"""
+
+	def __init__(self, token_cache_size=4096, source_file_cache_size=32, signature_cache_size=16384, selector_cache_size=256):
+		self.items = ItemRegistry()
+		self.item_refs = {}
+		self.deferred_members = {}
+		self.hidden_members = {}
+		self.source_files = SourceFileCache(source_file_cache_size)
+		self.signatures = SignatureCache(signature_cache_size)
+		self.names = {}
+		self.token_cache = cpplex.TokenCache(token_cache_size)
+		self.selector_cache_size = selector_cache_size
+		self._previous = []
+
+	def __enter__(self):
+		module = globals()
+		self._previous.append((
+			dict([(name, module[name]) for name in _session_variables]),
+			cpplex._token_cache,
+			xmlapi.selector_cache_size))
+		module.update({
+			'_items': self.items,
+			'_item_refs': self.item_refs,
+			'_deferred_members': self.deferred_members,
+			'_hidden_members': self.hidden_members,
+			'_source_files': self.source_files,
+			'_signatures': self.signatures,
+			'_names': self.names,
+		})
+		cpplex._token_cache = self.token_cache
+		xmlapi.selector_cache_size = self.selector_cache_size
+		return self
+
+	def __exit__(self, exc_type, exc_value, traceback):
+		variables, token_cache, selector_cache_size = self._previous.pop()
+		globals().update(variables)
+		cpplex._token_cache = token_cache
+		xmlapi.selector_cache_size = selector_cache_size
+		xmlapi.clear_selector_cache()
+		self.source_files.clear()
+
+
+def _create_session(options):
+	sizes = ['token_cache_size', 'source_file_cache_size', 'signature_cache_size', 'selector_cache_size']
+	return Session(**dict([(name, options[name]) for name in sizes if name in options]))
 
-		with open(os.path.join(rootdir, '%s.html' % item.ref), 'w') as f:
-			f.write('<!DOCTYPE html>\n')
-			f.write('<html>\n')
-			f.write('<head>\n')
-			f.write('<title>{0} documentation</title>\n'.format(item.item.qname))
-			f.write('<style type="text/css">\n')
-			f.write('    table       { width: 100%; }')
-			f.write('    table tr td { vertical-align: top; border-bottom: 1px solid #EEE; }')
-			f.write('    table tr td * { margin-top: 0; }')
-			f.write('    blockquote  { margin-top: 0; margin-bottom: 0; }\n')
-			f.write('    .identifier { font-weight: normal; color: navy; }\n')
-			f.write('    .keyword    { font-weight: bold;   color: green; }\n')
-			f.write('    .operator   { font-weight: normal; color: black; }\n')
-			f.write('    .literal    { font-weight: normal; color: magenta; }\n')
-			f.write('    .return     { font-weight: bold;   color: black; }\n')
-			f.write('</style>\n')
-			f.write('</head>\n')
-			f.write('<body>\n')
-			generate_html(f, item)
-			f.write('</body>\n')
-			f.write('</html>\n')
+
+def build(xml_paths, md_paths, outdir, options=None):
+	"""
+	Generate the HTML documentation for the doxygen XML and markdown files in
+	`outdir`, returning a dictionary of statistics about the build.
+
+	The `options` dictionary can contain the `lazy`, `incremental`, `cache` and
+	`jobs` options of the command line, and the cache sizes used to create the
+	`Session` the documentation is built in.
+
+	An incremental build does not parse anything if none of the input files
+	have changed, so the statistics do not count any compounds or items. If no
+	`cache` directory is given, it caches the parsed xml files in `outdir`, so
+	only the xml files that have changed are parsed again.
+	"""
+	options = options or {}
+	start = time.time()
+	with _create_session(options) as session:
+		jobs = options.get('jobs', 1)
+		cache = ModelCache(options['cache']) if options.get('cache') else None
+		manifest = None
+		if options.get('incremental'):
+			if not cache:
+				cache = ModelCache(os.path.join(outdir, '.cache'))
+			manifest = BuildManifest(os.path.join(outdir, '.manifest.json'))
+			manifest.begin(tool_version(), [(f, file_hash(f)) for f in list(xml_paths) + list(md_paths)])
+			if manifest.is_up_to_date(outdir):
+				return {
+					'compounds': 0,
+					'items': 0,
+					'pages': len(manifest.pages),
+					'written': 0,
+					'undocumented': 0,
+					'model_cache_hits': 0,
+					'model_cache_misses': 0,
+					'token_cache_hits': 0,
+					'token_cache_misses': 0,
+					'seconds': time.time() - start,
+				}
+		items = parse_doxygen_files(xml_paths, options.get('lazy', False), jobs, cache)
+		for filename in md_paths:
+			for item in docs.parse(filename, _items):
+				item.docs_source = filename
+		undocumented = report_undocumented()
+
+		if not os.path.exists(outdir):
+			os.makedirs(outdir)
+		written = write_pages(items, outdir, jobs, manifest)
+
+		return {
+			'compounds': len(items),
+			'items': len([ref for ref in session.item_refs.values() if ref.item]),
+			'pages': len(public_pages(items)),
+			'written': written,
+			'undocumented': undocumented,
+			'model_cache_hits': cache.hits if cache else 0,
+			'model_cache_misses': cache.misses if cache else 0,
+			'token_cache_hits': session.token_cache.hits,
+			'token_cache_misses': session.token_cache.misses,
+			'seconds': time.time() - start,
+		}
+
+
+def watch(filenames, outdir, options=None):
+	"""
+	Generate the HTML documentation for the doxygen XML and markdown files in
+	`outdir`, then regenerate the pages affected by changes to those files
+	until interrupted.
+
+	The options are the same as for `build`.
+	"""
+	options = options or {}
+	jobs = options.get('jobs', 1)
+	cache = ModelCache(options['cache']) if options.get('cache') else None
+	with _create_session(options):
+		watched = InputFiles(filenames, options.get('lazy', False), jobs, cache)
+		report_undocumented()
+		if not os.path.exists(outdir):
+			os.makedirs(outdir)
+		manifest = BuildManifest(os.path.join(outdir, '.manifest.json'))
+		manifest.begin(tool_version(), watched.inputs())
+		write_pages(watched.items(), outdir, jobs, manifest)
+
+		sys.stdout.write('info: watching for changes to the input files\n')
+		sys.stdout.flush()
+		try:
+			while True:
+				time.sleep(_watch_interval)
+				changed = watched.changed()
+				if len(changed) == 0:
+					continue
+				start = time.time()
+				try:
+					qnames = watched.reload(changed)
+				except Exception as e:
+					sys.stderr.write('error: {0}\n'.format(e))
+					continue
+				report_undocumented(qnames.union([qname for filename in changed for qname, _ in watched.names.get(filename, [])]))
+				manifest.begin(tool_version(), watched.inputs())
+				written = write_pages(watched.items(), outdir, jobs, manifest)
+				sys.stdout.write('info: regenerated {0} pages in {1:.2f}s\n'.format(written, time.time() - start))
+				sys.stdout.flush()
+		except KeyboardInterrupt:
+			pass
+
+
+if __name__ == '__main__':
+	parser = argparse.ArgumentParser(description='Generate HTML API documentation from doxygen XML and markdown files.')
+	parser.add_argument('files', nargs='*', help='the doxygen XML (.xml) and markdown (.md) files')
+	parser.add_argument('--lazy', action='store_true', help='only build the class and namespace members that are needed, such as the public and documented members')
+	parser.add_argument('--incremental', action='store_true', help='only regenerate the pages whose items have changed since the last incremental build')
+	parser.add_argument('--watch', action='store_true', help='keep running, regenerating the pages whose inputs have changed when the input files are modified')
+	parser.add_argument('--cache', metavar='DIR', help='cache the parsed XML files in this directory, and reuse them if the XML files have not changed')
+	parser.add_argument('-j', '--jobs', type=int, default=1, help='the number of processes used to parse the XML files and write the HTML files')
+	args = parser.parse_args()
+
+	rootdir = 'docs/api/html'
+	if args.watch:
+		watch(args.files, rootdir, vars(args))
+	else:
+		build([f for f in args.files if f.endswith('.xml')], [f for f in args.files if f.endswith('.md')], rootdir, vars(args))
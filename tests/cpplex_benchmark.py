@@ -0,0 +1,187 @@
+#!/usr/bin/python
+
+# Copyright (C) 2014 Reece H. Dunn
+#
+# This file is part of documentation-generator.
+#
+# documentation-generator is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# documentation-generator is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with documentation-generator.  If not, see <http://www.gnu.org/licenses/>.
+
+import os
+import sys
+import json
+import random
+import argparse
+
+from timeit import default_timer as timer
+
+sys.path.append(os.path.join(sys.path[0], '..'))
+
+import cpplex
+
+_stl_header = '''
+namespace std
+{
+	template <class _Tp, class _Alloc = allocator<_Tp> >
+	class vector : protected _Vector_base<_Tp, _Alloc>
+	{
+	public:
+		typedef _Tp value_type;
+		typedef typename _Alloc::pointer pointer;
+		typedef typename _Alloc::const_reference const_reference;
+		typedef size_t size_type;
+		typedef ptrdiff_t difference_type;
+
+		vector() noexcept(is_nothrow_default_constructible<_Alloc>::value) : _Base() { }
+		explicit vector(size_type __n, const value_type& __value = value_type(), const allocator_type& __a = allocator_type());
+		vector(const vector& __x);
+		vector(vector&& __x) noexcept : _Base(std::move(__x)) { }
+		~vector() noexcept { std::_Destroy(this->_M_impl._M_start, this->_M_impl._M_finish); }
+
+		vector& operator=(const vector& __x);
+		vector& operator=(vector&& __x) noexcept(_Alloc_traits::_S_nothrow_move());
+
+		size_type size() const noexcept { return size_type(this->_M_impl._M_finish - this->_M_impl._M_start); }
+		size_type max_size() const noexcept { return _Alloc_traits::max_size(_M_get_Tp_allocator()); }
+		bool empty() const noexcept { return begin() == end(); }
+		reference operator[](size_type __n) noexcept { return *(this->_M_impl._M_start + __n); }
+		void push_back(const value_type& __x)
+		{
+			if (this->_M_impl._M_finish != this->_M_impl._M_end_of_storage)
+			{
+				_Alloc_traits::construct(this->_M_impl, this->_M_impl._M_finish, __x);
+				++this->_M_impl._M_finish;
+			}
+			else
+				_M_realloc_insert(end(), __x);
+		}
+		template<typename... _Args>
+		void emplace_back(_Args&&... __args);
+	};
+
+	template<typename _Tp, typename _Alloc>
+	inline bool operator<(const vector<_Tp, _Alloc>& __x, const vector<_Tp, _Alloc>& __y)
+	{ return std::lexicographical_compare(__x.begin(), __x.end(), __y.begin(), __y.end()); }
+}
+'''
+
+_type_fragments = [
+	'const ', ' &', ' *', 'std::size_t', 'int', 'void', 'bool', 'const char *',
+	'unsigned long long', 'std::string', ' &&', 'typename ', '::', '< ',
+	' >', ', ', 'static constexpr ', 'void(*', ')(int value, const char *)',
+	'(const std::vector< T > &v, std::size_t n=0) const',
+]
+
+_literals = [
+	'0', '01234567', '42', '42u', '42ULL', '0x1fULL', '0xABCDEFl', '1.5', '2.e-33f',
+	'6e+5L', "'a'", "L'\\0'", '"abc"', 'L"wide string"', 'true', 'false', 'nullptr',
+]
+
+_operators = [
+	'{', '}', '[', ']', '#', '##', '(', ')', '...', ';', ':', '?', '::', '.', '.*',
+	'+', '-', '*', '/', '%', '^', '&', '|', '~', '!', '=', '<', '>', '+=', '-=',
+	'*=', '/=', '%=', '^=', '&=', '|=', '<<', '>>', '>>=', '<<=', '==', '!=', '<=',
+	'>=', '&&', '||', '++', '--', ',', '->*', '->', '<:', ':>', '<%', '%>', '%:',
+	'%:%:', '??=', '??/', '??(', '??)',
+]
+
+
+def corpora(scale):
+	rng = random.Random(0)
+	ret = []
+	ret.append(('stl-header', [_stl_header] * scale))
+	ret.append(('type-fragments', [rng.choice(_type_fragments) for _ in range(200 * scale)]))
+	ret.append(('literals', [' '.join([rng.choice(_literals) for _ in range(100)]) for _ in range(2 * scale)]))
+	ret.append(('operators', [' '.join([rng.choice(_operators) for _ in range(100)]) for _ in range(2 * scale)]))
+	ret.append(('long-line', [' '.join(_stl_header.split()) * scale]))
+	return ret
+
+
+def file_corpus(filename):
+	with open(filename, 'rb') as f:
+		return (os.path.basename(filename), [f.read().decode('utf-8')])
+
+
+def measure(texts, repeat):
+	count = 0
+	for text in texts:
+		for token in cpplex.tokenize(text):
+			count = count + 1
+	size = sum([len(text.encode('utf-8')) for text in texts])
+	best = None
+	for _ in range(repeat):
+		start = timer()
+		for text in texts:
+			for token in cpplex.tokenize(text):
+				pass
+		elapsed = timer() - start
+		if best is None or elapsed < best:
+			best = elapsed
+	best = max(best, 1e-9)
+	return {
+		'tokens': count,
+		'bytes': size,
+		'seconds': best,
+		'tokens_per_sec': count / best,
+		'bytes_per_sec': size / best,
+	}
+
+
+def compare(results, baseline, threshold):
+	regressions = []
+	for name, result in sorted(results.items()):
+		if name not in baseline:
+			continue
+		expected = baseline[name]['tokens_per_sec']
+		change = (result['tokens_per_sec'] - expected) / expected
+		print('%-16s %+7.1f%% vs baseline' % (name, change * 100))
+		if change < -threshold:
+			regressions.append(name)
+	return regressions
+
+
+def main():
+	parser = argparse.ArgumentParser(description='Measure the throughput of cpplex.tokenize.')
+	parser.add_argument('files', nargs='*', help='additional C++ files to tokenize')
+	parser.add_argument('--scale', type=int, default=50, help='size of the generated corpora')
+	parser.add_argument('--repeat', type=int, default=5, help='number of timed runs (the best is reported)')
+	parser.add_argument('--output', help='write the results to this JSON file')
+	parser.add_argument('--baseline', help='compare the results against this JSON file')
+	parser.add_argument('--threshold', type=float, default=0.1, help='fractional slowdown treated as a regression')
+	args = parser.parse_args()
+
+	results = {}
+	for name, texts in corpora(args.scale) + [file_corpus(f) for f in args.files]:
+		try:
+			result = measure(texts, args.repeat)
+		except Exception as e:
+			print('%-16s error: %s' % (name, str(e).split('\n')[0]))
+			continue
+		results[name] = result
+		print('%-16s %10d tokens %10.0f tokens/sec %12.0f bytes/sec' % (name, result['tokens'], result['tokens_per_sec'], result['bytes_per_sec']))
+
+	if args.output:
+		with open(args.output, 'w') as f:
+			json.dump(results, f, indent=2, sort_keys=True)
+
+	if args.baseline:
+		with open(args.baseline) as f:
+			baseline = json.load(f)
+		regressions = compare(results, baseline, args.threshold)
+		if len(regressions) > 0:
+			print('regression : %s' % ', '.join(regressions))
+			sys.exit(1)
+
+
+if __name__ == '__main__':
+	main()
@@ -41,6 +41,15 @@ def run(text, result):
 		print('%s test %s failed -- expected %s, got %s' % (parser.__name__, repr(text), expected, got))
 		failed = failed + 1
 
+def check(name, result):
+	global passed
+	global failed
+	if result:
+		passed = passed + 1
+	else:
+		print('check %s failed' % name)
+		failed = failed + 1
+
 def summary():
 	print('passed : %d' % passed)
 	print('failed : %d' % failed)
@@ -122,4 +131,76 @@ strings = ['""', '"abc"', 'L""', 'L"abc"']
 for s in strings:
 	run(s, [cpplex.Literal(s, 'string')])
 
+# token sequences
+run('const std::size_t &', [
+	cpplex.Keyword('const', None), cpplex.WhiteSpace(' ', None),
+	cpplex.Identifier('std', None), cpplex.Operator('::', None), cpplex.Identifier('size_t', None),
+	cpplex.WhiteSpace(' ', None), cpplex.Operator('&', None)])
+run('enum class', [cpplex.Keyword('enum', None), cpplex.WhiteSpace(' ', None), cpplex.Keyword('class', None)])
+run('constant', [cpplex.Identifier('constant', None)])
+run('a!=b,c==0x1fULL', [
+	cpplex.Identifier('a', None), cpplex.Operator('!=', None), cpplex.Identifier('b', None),
+	cpplex.Operator(',', None), cpplex.Identifier('c', None), cpplex.Operator('==', None),
+	cpplex.Literal('0x1fULL', 'hexadecimal')])
+run(')(int value, const char *)', [
+	cpplex.Operator(')', None), cpplex.Operator('(', None), cpplex.Keyword('int', None),
+	cpplex.WhiteSpace(' ', None), cpplex.Identifier('value', None), cpplex.Operator(',', None),
+	cpplex.WhiteSpace(' ', None), cpplex.Keyword('const', None), cpplex.WhiteSpace(' ', None),
+	cpplex.Keyword('char', None), cpplex.WhiteSpace(' ', None), cpplex.Operator('*', None),
+	cpplex.Operator(')', None)])
+run('a @ b', Exception('Invalid C++ token : @ b'))
+
+# interned tokens
+tokens = list(cpplex.tokenize('const int x')) + list(cpplex.tokenize('const int x'))
+check('keywords are interned', tokens[0] is tokens[5] and tokens[0] is cpplex.Keyword('const'))
+check('operators are interned', cpplex.Operator('::') is cpplex.Operator('::'))
+check('common whitespace is interned', tokens[1] is tokens[6] and tokens[1] is cpplex.WhiteSpace(' '))
+check('identifiers are not interned', tokens[4] is not tokens[9])
+try:
+	tokens[0].value = 'int'
+	check('tokens are immutable', False)
+except AttributeError:
+	check('tokens are immutable', tokens[0].value == 'const')
+
+# token cache
+cache = cpplex.TokenCache(size=2)
+a = cache.tokenize('const ')
+check('cache miss', cache.misses == 1 and cache.hits == 0 and a == (cpplex.Keyword('const'), cpplex.WhiteSpace(' ')))
+check('cache hit', cache.tokenize('const ') is a and cache.hits == 1)
+cache.tokenize(' &')
+cache.tokenize('const ')
+cache.tokenize('std::size_t')
+check('cache size bound', len(cache) == 2)
+check('least recently used entry evicted', cache.tokenize('const ') is a and cache.tokenize(' &') is not None and cache.misses == 4)
+check('disabled cache', cpplex.TokenCache(size=0).tokenize('int') == (cpplex.Keyword('int'),))
+
+# html rendering
+def html(text):
+	return cpplex.render_html(cpplex.tokenize(text))
+check('render keywords', html('const int') == '<span class="keyword">const</span> <span class="keyword">int</span>')
+check('render identifiers', html('a') == '<span class="identifier">a</span>')
+check('render operators', html('&&<') == '<span class="operator">&amp;&amp;</span><span class="operator">&lt;</span>')
+check('render literals', html('"<a&b>"') == '<span class="literal string">"&lt;a&amp;b&gt;"</span>')
+check('render interned operator', cpplex.Operator('->').html == '<span class="operator">-&gt;</span>')
+check('escape', cpplex.escape('a<b && c>d') == 'a&lt;b &amp;&amp; c&gt;d')
+text = 'nothing to escape'
+check('escape unchanged text', cpplex.escape(text) is text)
+
+# token streams
+text = 'const std::size_t &x = 0x1fULL'
+stream = cpplex.tokenize_stream(text)
+check('stream tokens', repr(list(stream)) == repr(list(cpplex.tokenize(text))))
+check('stream length', len(stream) == 12)
+check('stream index', repr(stream[-1]) == repr(cpplex.Literal('0x1fULL', 'hexadecimal')))
+check('stream value', stream.value(2) == 'std' and stream.token_type(2) == cpplex.Identifier)
+view = stream[2:5]
+check('stream slice', repr(list(view)) == repr(list(cpplex.tokenize('std::size_t'))) and view.codes is stream.codes)
+check('stream slice of slice', repr(list(view[1:])) == repr(list(cpplex.tokenize('::size_t'))))
+check('empty stream slice', len(stream[5:2]) == 0)
+try:
+	cpplex.tokenize_stream('a @ b')
+	check('invalid stream token', False)
+except Exception as e:
+	check('invalid stream token', str(e) == 'Invalid C++ token : @ b')
+
 summary()
@@ -0,0 +1,123 @@
+#!/usr/bin/python
+
+# Copyright (C) 2014 Reece H. Dunn
+#
+# This file is part of documentation-generator.
+#
+# documentation-generator is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# documentation-generator is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with documentation-generator.  If not, see <http://www.gnu.org/licenses/>.
+
+import os
+import sys
+import gc
+import tempfile
+import argparse
+
+from timeit import default_timer as timer
+
+try:
+	import tracemalloc
+except ImportError:
+	tracemalloc = None
+
+sys.path.append(os.path.join(sys.path[0], '..'))
+
+import doxygen
+
+_memberdef = '''
+      <memberdef kind="function" id="classa_1f%(n)d" prot="%(prot)s" static="no" const="no" explicit="no" inline="no" virt="non-virtual">
+        <type>int</type>
+        <definition>int a::f%(n)d</definition>
+        <argsstring>(int x, const char *y) const</argsstring>
+        <name>f%(n)d</name>
+        <param>
+          <type>int</type>
+          <declname>x</declname>
+        </param>
+        <param>
+          <type>const char *</type>
+          <declname>y</declname>
+        </param>
+        <briefdescription>
+          <para>The f%(n)d function.</para>
+        </briefdescription>
+        <detaileddescription>
+          <para>Calculate the f%(n)d value of <parametername>x</parametername> and <parametername>y</parametername>.</para>
+        </detaileddescription>
+        <location file="a.hpp" line="%(n)d" column="1"/>
+      </memberdef>'''
+
+
+def document(members):
+	sections = []
+	for prot in ['public', 'private']:
+		sections.append('<sectiondef kind="%s-func">%s</sectiondef>' % (prot,
+			''.join([_memberdef % {'n': n, 'prot': prot} for n in range(len(sections), members, 2)])))
+	return '<doxygen><compounddef id="classa" kind="class" prot="public"><compoundname>a</compoundname>%s<location file="a.hpp" line="1" column="1"/></compounddef></doxygen>' % \
+		''.join(sections)
+
+
+def parse(filename, lazy):
+	# The members are materialized, as they are when the pages are written, so
+	# both modes build the same public members.
+	ref = doxygen.parse_doxygen(filename, lazy)
+	doxygen.materialize(ref.item.qname)
+	return ref
+
+
+def measure(filename, lazy, repeat):
+	best = None
+	for _ in range(repeat):
+		with doxygen.Session():
+			gc.collect()
+			start = timer()
+			parse(filename, lazy)
+			elapsed = timer() - start
+		if best is None or elapsed < best:
+			best = elapsed
+	with doxygen.Session():
+		gc.collect()
+		if tracemalloc:
+			tracemalloc.start()
+			parse(filename, lazy)
+			gc.collect()
+			current, peak = tracemalloc.get_traced_memory()
+			tracemalloc.stop()
+			memory = '%6.1f MB retained %6.1f MB peak' % (current / 1048576.0, peak / 1048576.0)
+		else:
+			before = len(gc.get_objects())
+			parse(filename, lazy)
+			gc.collect()
+			memory = '%8d objects retained' % (len(gc.get_objects()) - before)
+	return best, memory
+
+
+def main():
+	parser = argparse.ArgumentParser(description='Compare the lazy and eager parsing of a doxygen XML file.')
+	parser.add_argument('--members', type=int, default=3000, help='number of memberdef nodes in the class (half of them are private)')
+	parser.add_argument('--repeat', type=int, default=5, help='number of timed runs (the best is reported)')
+	args = parser.parse_args()
+
+	fd, filename = tempfile.mkstemp(suffix='.xml')
+	with os.fdopen(fd, 'w') as f:
+		f.write(document(args.members))
+	try:
+		for lazy in [False, True]:
+			elapsed, memory = measure(filename, lazy, args.repeat)
+			print('%-5s %8.3f sec %s' % (lazy and 'lazy' or 'eager', elapsed, memory))
+	finally:
+		os.remove(filename)
+
+
+if __name__ == '__main__':
+	main()
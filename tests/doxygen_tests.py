@@ -0,0 +1,410 @@
+#!/usr/bin/python
+
+# Copyright (C) 2014 Reece H. Dunn
+#
+# This file is part of documentation-generator.
+#
+# documentation-generator is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# documentation-generator is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with documentation-generator.  If not, see <http://www.gnu.org/licenses/>.
+
+import os
+import sys
+import shutil
+import tempfile
+
+sys.path.append(os.path.join(sys.path[0], '..'))
+
+import doxygen
+import docs
+
+from xml.etree import ElementTree
+
+passed = 0
+failed = 0
+
+def run(name, got, expected):
+	global passed
+	global failed
+	if expected == got:
+		passed = passed + 1
+	else:
+		print('%s test failed -- expected %s, got %s' % (name, repr(expected), repr(got)))
+		failed = failed + 1
+
+def summary():
+	print('passed : %d' % passed)
+	print('failed : %d' % failed)
+	print('total  : %d' % (passed + failed))
+
+tempdir = tempfile.mkdtemp()
+
+def write(name, text):
+	filename = os.path.join(tempdir, name)
+	with open(filename, 'wb') as f:
+		f.write(text.encode('utf-8'))
+	return filename
+
+def source_lines(text):
+	source = doxygen.SourceFile(write('source.hpp', text))
+	try:
+		return [source[i] for i in range(len(source))], source[-1]
+	finally:
+		source.close()
+
+# source files
+run('source lines', source_lines('a\nb\n'), (['a', 'b', ''], ''))
+run('empty source file', source_lines(''), ([''], ''))
+run('no trailing newline', source_lines('a\nb'), (['a', 'b'], 'b'))
+run('crlf line endings', source_lines('a\r\nb\r\nc'), (['a', 'b', 'c'], 'c'))
+source = doxygen.SourceFile(write('source.hpp', 'a\nb\nc'))
+run('negative line index', (source[-2], source[-3]), ('b', 'a'))
+for lineno in [3, -4]:
+	try:
+		source[lineno]
+		run('missing line %d' % lineno, False, True)
+	except IndexError:
+		run('missing line %d' % lineno, True, True)
+source.close()
+
+# item references
+ref = doxygen.ItemRef('structfoo_3_01int_01_4')
+ref.item = doxygen.Item('public', 'struct', 'foo< int >')
+run('escaped item reference', ref.html, '<a href="structfoo_3_01int_01_4.html">foo&lt; int &gt;</a>')
+
+# item registry
+with doxygen.Session():
+	items = doxygen._items
+	for qname in ['a', 'a::b', 'a::b::c', 'a::d', 'x']:
+		items[qname] = [qname.upper()]
+	run('resolve qualified name', items.resolve('a::b', 'x'), ['A::B'])
+	run('resolve in scope', items.resolve('c', 'a::b'), ['A::B::C'])
+	run('resolve in enclosing scope', items.resolve('d', 'a::b::c'), ['A::D'])
+	run('resolve in global scope', items.resolve('x', 'a::b'), ['X'])
+	items['b'] = ['B']
+	run('resolve hides global name', (items.resolve('b', 'a'), items.resolve('b', 'x'), items.resolve('b')), (['A::B'], ['B'], ['B']))
+	del items['b']
+	for name, scope in [('c', 'a'), ('c', None), ('b::c', 'x')]:
+		try:
+			items.resolve(name, scope)
+			run('resolve %s in %s' % (name, scope), False, True)
+		except KeyError:
+			run('resolve %s in %s' % (name, scope), True, True)
+	run('contents', list(items.contents('a')), [('a::b', ['A::B']), ('a::b::c', ['A::B::C']), ('a::d', ['A::D'])])
+	del items['a::b']
+	run('contents of removed name', list(items.contents('a')), [('a::b::c', ['A::B::C']), ('a::d', ['A::D'])])
+	run('no contents', (list(items.contents('x')), list(items.contents('y'))), ([], []))
+	item = doxygen.Item('public', 'function', 'p::q::r')
+	scope = doxygen.Item('public', 'namespace', 'p')
+	run('scoped name', list(doxygen.get_scoped_name(item, scope)), [('q', 'p::q'), ('r', 'p::q::r')])
+	run('global scoped name', list(doxygen.get_scoped_name(item, None)), [('p', 'p'), ('q', 'p::q'), ('r', 'p::q::r')])
+	run('scoped name in registry', list(doxygen.get_scoped_name(doxygen.Item('public', 'class', 'a::b::c'), doxygen.Item('public', 'class', 'a::d'))), [('b', 'a::b'), ('c', 'a::b::c')])
+
+# overloads
+def function(refid, qname, args):
+	ref = doxygen.create_item_ref(refid)
+	doxygen.create_item(ref, 'public', 'function', qname)
+	for name in args:
+		ref.item.add_arg(doxygen.Variable('public', 'parameter', name))
+	return ref.item
+
+def bind_overload(items, args):
+	processor = docs.documentationProcessor(items)
+	processor.qname = 'a::f'
+	processor.refs = items['a::f']
+	processor.doc = docs.Documentation()
+	processor.param_doc = dict([(name, docs.Documentation()) for name in args])
+	processor.process_documentation()
+	return processor
+
+with doxygen.Session():
+	f1 = function('f1', 'a::f', ['x'])
+	f2 = function('f2', 'a::f', ['y', 'x'])
+	run('overloads', doxygen._items.overloads('a::f'), {('x',): [f1], ('x', 'y'): [f2]})
+	run('function argument', (f2.arg('y') is f2.args[0], f2.arg('x') is f2.args[1]), (True, True))
+	try:
+		f2.arg('z')
+		run('missing function argument', False, True)
+	except KeyError:
+		run('missing function argument', True, True)
+	f3 = function('f3', 'a::f', ['z'])
+	run('overloads after create_item', doxygen._items.overloads('a::f'), {('x',): [f1], ('x', 'y'): [f2], ('z',): [f3]})
+	processor = bind_overload(doxygen._items, ['x', 'y'])
+	run('bind overload', (processor.documented, f2.docs is processor.doc, f2.arg('x').docs is processor.param_doc['x']), ([f2], True, True))
+	processor = bind_overload(dict(doxygen._items), ['z'])
+	run('bind overload with a dictionary', (processor.documented, f3.docs is processor.doc), ([f3], True))
+
+# doxygen xml files
+_namespace_xml = '''<?xml version="1.0" encoding="UTF-8"?>
+<doxygen>
+  <compounddef id="namespace%(ns)s" kind="namespace">
+    <compoundname>%(ns)s</compoundname>
+    <sectiondef kind="enum">%(members)s
+    </sectiondef>
+    <location file="%(header)s" line="1"/>
+  </compounddef>
+</doxygen>'''
+
+_enum_xml = '''
+      <memberdef kind="enum" id="namespace%(ns)s_1%(name)s" prot="%(prot)s" static="no">
+        <name>%(name)s</name>
+        <location file="%(header)s" line="%(line)d"/>
+      </memberdef>'''
+
+def namespace_xml(ns, enums, private=()):
+	"""Write the header and doxygen XML file of a namespace with the given enums."""
+	header = write('%s.hpp' % ns, 'namespace %s {\n%s}\n' % (ns, ''.join(['enum %s\n{ };\n' % name for name in enums])))
+	members = [_enum_xml % {'ns': ns, 'name': name, 'prot': 'private' if name in private else 'public', 'header': header, 'line': 3 + 2 * i} for i, name in enumerate(enums)]
+	return write('namespace%s.xml' % ns, _namespace_xml % {'ns': ns, 'header': header, 'members': ''.join(members)})
+
+with doxygen.Session():
+	ref = doxygen.parse_doxygen(namespace_xml('test', ['colour', 'shape'], ['shape']), lazy=True)
+	doxygen.materialize_all()
+	run('lazy public members', ([child.item.qname for child in ref.item.children], 'test::shape' in doxygen._items), (['test::colour'], False))
+	run('lazy non-public member', doxygen._items['test::shape'][0].item.protection, 'private')
+	run('lazy non-public members', [child.item.qname for child in ref.item.children], ['test::colour', 'test::shape'])
+
+# signature cache
+with doxygen.Session():
+	a, b, c = [doxygen.Item('public', 'class', name) for name in ['a', 'b', 'c']]
+	cache = doxygen.SignatureCache(2)
+	run('signature tokens', [token.value for token in cache.tokens(a, None)], ['class', ' ', 'a'])
+	cache.tokens(b, None)
+	cache.tokens(a, None)
+	cache.tokens(c, None)
+	run('signature cache bound', (len(cache), cache._get(a, None)[0] is not None, cache._get(b, None)), (2, True, (None, None)))
+	run('signature html', cache.html(c, None), '<span class="keyword">class</span> <span class="identifier">c</span>')
+	run('signature html of a cached item', (len(cache), cache._get(a, None)[0] is not None, cache._get(c, None)[1] is not None), (2, True, True))
+
+with doxygen.Session():
+	inputs = doxygen.InputFiles([namespace_xml('test', ['colour'])])
+	colour = doxygen._items['test::colour'][0].item
+	html = doxygen.signature_html(colour, None)
+	run('cached signature', (len(doxygen._signatures), html), (1, '<span class="keyword">enum</span> <a href="namespacetest.html">test</a><span class="operator">::</span><span class="identifier">colour</span>'))
+	inputs.reload([namespace_xml('test', ['colour'])])
+	run('signatures dropped on reload', (len(doxygen._signatures), doxygen._signatures._get(colour, None)), (0, (None, None)))
+	run('signature after reload', doxygen.signature_html(doxygen._items['test::colour'][0].item, None), html)
+
+# builds
+outdir = os.path.join(tempdir, 'html')
+stats = doxygen.build([namespace_xml('test', ['colour'])], [], outdir)
+run('build pages', (stats['compounds'], stats['items'], stats['pages'], stats['written']), (1, 2, 1, 1))
+run('build page files', sorted(os.listdir(outdir)), ['documentation.css', 'namespacetest.html'])
+run('build releases the pages', (doxygen._pages, doxygen._pages_dir), ([], None))
+
+outdir = os.path.join(tempdir, 'incremental')
+test = namespace_xml('test', ['colour'])
+other = namespace_xml('other', ['shape'])
+stats = doxygen.build([test, other], [], outdir, {'incremental': True})
+run('incremental build', (stats['compounds'], stats['pages'], stats['written']), (2, 2, 2))
+stats = doxygen.build([test, other], [], outdir, {'incremental': True})
+run('unchanged incremental build', (stats['compounds'], stats['pages'], stats['written']), (0, 2, 0))
+namespace_xml('other', ['shape', 'size'])
+stats = doxygen.build([test, other], [], outdir, {'incremental': True})
+run('changed incremental build', (stats['compounds'], stats['pages'], stats['written'], stats['model_cache_hits']), (2, 2, 1, 1))
+stats = doxygen.build([test], [], outdir, {'incremental': True})
+run('removed page', (stats['pages'], stats['written'], sorted(os.listdir(outdir))), (1, 1, ['.cache', '.manifest.json', 'documentation.css', 'namespacetest.html']))
+
+# page errors
+with doxygen.Session():
+	ref = doxygen.parse_doxygen(namespace_xml('test', ['colour']))
+	ref.item.docs = docs.Documentation()
+	ref.item.docs.brief = ElementTree.fromstring('<p>A <a href="^^colour">colour</a> and a <a href="^^shape">shape</a>.</p>')
+	errors = []
+	html = doxygen.page_html(ref, errors)
+	run('page errors', errors, ['error: cross reference shape not found\n'])
+	run('page error links', '<p>A <a href="namespacetest_1colour.html">colour</a> and a shape.</p>' in str(html), True)
+	run('page errors not written', sys.stderr, sys.__stderr__)
+
+# model cache
+cache = doxygen.ModelCache(os.path.join(tempdir, 'cache'))
+for name, enums, hits, misses in [('miss', ['colour'], 0, 1), ('hit', ['colour'], 1, 1), ('changed file', ['colour', 'shape'], 1, 2)]:
+	with doxygen.Session():
+		refs = doxygen.parse_doxygen_files([namespace_xml('test', enums)], cache=cache)
+		run('model cache %s' % name, (cache.hits, cache.misses), (hits, misses))
+		run('model cache %s items' % name, [ref.item.qname for ref in refs + refs[0].item.children], ['test'] + ['test::%s' % n for n in enums])
+
+with doxygen.Session():
+	items = doxygen._items
+	refs = doxygen.parse_doxygen_files([namespace_xml('test', ['colour'])])
+	compounds, definitions, names = doxygen._parse_doxygen_model((namespace_xml('other', ['shape']), False))
+	run('parsed model', (compounds, sorted(names)), (['namespaceother'], [('other', 'namespaceother'), ('other::shape', 'namespaceother_1shape')]))
+	run('parsed model registries', (doxygen._items is items, sorted(items.keys()), sorted(doxygen._item_refs.keys())), (True, ['test', 'test::colour'], ['namespacetest', 'namespacetest_1colour']))
+
+# parallel parsing
+_class_xml = '''
+  <compounddef id="class%(name)s" kind="class" prot="public">
+    <compoundname>%(name)s</compoundname>
+    <sectiondef kind="public-func">
+      <memberdef kind="function" id="class%(name)s_1f" prot="public" static="no">
+        <type><ref refid="class%(other)s" kindref="compound">%(other)s</ref></type>
+        <name>f</name>
+        <argsstring>(%(other)s x)</argsstring>
+        <param><type><ref refid="class%(other)s" kindref="compound">%(other)s</ref></type><declname>x</declname></param>
+        <location file="%(name)s.hpp" line="3"/>
+      </memberdef>
+    </sectiondef>
+    <location file="%(name)s.hpp" line="1"/>
+  </compounddef>'''
+
+def class_xml(filename, classes):
+	"""Write a doxygen XML file of classes with a function using another class."""
+	compounds = [_class_xml % {'name': name, 'other': other} for name, other in classes]
+	return write(filename, '<?xml version="1.0" encoding="UTF-8"?>\n<doxygen>%s\n</doxygen>' % ''.join(compounds))
+
+def parsed_model(filenames, jobs):
+	with doxygen.Session():
+		compounds = doxygen.parse_doxygen_files(filenames, jobs=jobs)
+		items = sorted([(qname, [ref.ref for ref in refs]) for qname, refs in doxygen._items.items()])
+		item_refs = sorted([(refid, ref.item.qname if ref.item else None) for refid, ref in doxygen._item_refs.items()])
+		pages = [doxygen.page_html(compound, []) for compound in compounds]
+		return [compound.ref for compound in compounds], items, item_refs, pages
+
+# classa.xml uses classb before classb.xml defines it.
+filenames = [class_xml('classa.xml', [('a', 'b')]), class_xml('classb.xml', [('b', 'a')])]
+serial = parsed_model(filenames, 1)
+run('serial parse', (serial[0], serial[1]), (['classa', 'classb'], [('a', ['classa']), ('a::f', ['classa_1f']), ('b', ['classb']), ('b::f', ['classb_1f'])]))
+run('serial parse links', ['<a href="classb.html">b</a>' in str(serial[3][0]), '<a href="classa.html">a</a>' in str(serial[3][1])], [True, True])
+run('parallel parse', parsed_model(filenames, 2), serial)
+run('parallel parse in a different order', parsed_model(list(reversed(filenames)), 2)[1:3], serial[1:3])
+
+combined = [class_xml('all.xml', [('a', 'b'), ('b', 'a')])]
+run('combined xml file', parsed_model(combined, 1), serial)
+run('parallel combined xml files', parsed_model(combined + [class_xml('classc.xml', [('c', 'a')])], 2)[0], ['classa', 'classb', 'classc'])
+
+# build manifest
+manifest = doxygen.BuildManifest(os.path.join(tempdir, 'manifest.json'))
+page = write('page.html', '')
+inputs = [('a.xml', '1'), ('b.md', '1')]
+manifest.begin('1', inputs)
+run('new manifest', (manifest.is_up_to_date(tempdir), manifest.changed), (False, set(['a.xml', 'b.md'])))
+run('outdated new page', manifest.is_outdated('page', page, {'a': '1'}), True)
+manifest.add_page('page', ['a.xml'], {'a': '1', '^^a b': None})
+manifest.save()
+manifest = doxygen.BuildManifest(os.path.join(tempdir, 'manifest.json'))
+manifest.begin('1', inputs)
+run('unchanged inputs', (manifest.is_up_to_date(tempdir), manifest.changed), (True, set()))
+run('outdated unchanged page', manifest.is_outdated('page', page, {'a': '1', '^^a b': None}), False)
+run('outdated changed item', manifest.is_outdated('page', page, {'a': '2', '^^a b': None}), True)
+run('outdated added item', manifest.is_outdated('page', page, {'a': '1', 'b': '1', '^^a b': None}), True)
+run('outdated resolved reference', manifest.is_outdated('page', page, {'a': '1', '^^a b': 'b a::b'}), True)
+run('outdated missing file', manifest.is_outdated('page', os.path.join(tempdir, 'missing.html'), {'a': '1', '^^a b': None}), True)
+run('removed pages', (manifest.removed_pages(), manifest.add_page('page', [], {}), manifest.removed_pages()), (['page'], None, []))
+manifest.begin('1', [('a.xml', '2'), ('b.md', '1')])
+run('changed input', (manifest.is_up_to_date(tempdir), manifest.changed, manifest.is_outdated('page', page, {'a': '1', '^^a b': None})), (False, set(['a.xml']), False))
+manifest.begin('1', [('b.md', '1'), ('a.xml', '1')])
+run('reordered inputs', (manifest.is_up_to_date(tempdir), manifest.is_outdated('page', page, {'a': '1', '^^a b': None})), (False, True))
+manifest.begin('2', inputs)
+run('outdated generator', (manifest.is_up_to_date(tempdir), manifest.is_outdated('page', page, {'a': '1', '^^a b': None})), (False, True))
+
+inputs = [('a.xml', '1'), ('b.md', '1'), ('c.xml', '1')]
+manifest = doxygen.BuildManifest(os.path.join(tempdir, 'affected.json'))
+manifest.begin('1', inputs)
+manifest.add_page('page', ['a.xml', 'c.xml'], {'a': '1', '^^x::y b': 'b b'})
+manifest.add_page('unresolved', ['a.xml'], {'a': '1', '^^x::y b': None})
+manifest.save()
+manifest = doxygen.BuildManifest(os.path.join(tempdir, 'affected.json'))
+manifest.begin('1', [('a.xml', '1'), ('b.md', '2'), ('c.xml', '1')])
+for name, refids, qnames, expected in [('no changed items', [], [], False), ('changed item', ['a'], ['a'], True), ('changed link target', ['b'], ['b'], True),
+                                       ('hiding item', ['xb'], ['x::b'], True), ('other scope', ['zb'], ['z::b'], False)]:
+	run('affected by %s' % name, manifest.is_affected('page', page, set(refids), set(qnames)), expected)
+run('affected unresolved reference', manifest.is_affected('unresolved', page, set(), set()), True)
+run('affected new page', manifest.is_affected('new', page, set(), set()), True)
+manifest.keep_page('page')
+run('kept page', (manifest.removed_pages(), manifest._pages['page']), (['unresolved'], {'files': ['a.xml', 'c.xml'], 'items': {'a': '1', '^^x::y b': 'b b'}}))
+manifest.begin('1', [('a.xml', '1'), ('b.md', '1'), ('c.xml', '2')])
+run('affected by a changed file', manifest.is_affected('page', page, set(), set()), True)
+
+os.remove(page)
+manifest.begin('1', inputs)
+run('missing page', manifest.is_up_to_date(tempdir), False)
+
+# input files
+def markdown(name, documented):
+	return write(name, ''.join(['# %s {: .doc }\n\n%s\n\n' % (qname, text) for qname, text in documented]))
+
+def brief(qname):
+	item = doxygen._items[qname][0].item
+	if not item.docs:
+		return None
+	return ''.join(item.docs.brief.itertext()), os.path.basename(item.docs_source)
+
+try:
+	docs.parse(write('empty.md', ''), doxygen.ItemRegistry())
+	bind_markdown = True
+except (AttributeError, TypeError): # markdown 3 does not support the extension API used by docs.py
+	bind_markdown = False
+
+if bind_markdown:
+	with doxygen.Session():
+		xml = namespace_xml('test', ['colour', 'shape'])
+		a = markdown('a.md', [('test::colour', 'A colour.'), ('test::shape', 'A shape.')])
+		b = markdown('b.md', [('test::colour', 'Another colour.')])
+		inputs = doxygen.InputFiles([xml, a, b])
+		run('bound docs', (brief('test::colour'), brief('test::shape')), (('Another colour.', 'b.md'), ('A shape.', 'a.md')))
+		page = inputs.items()[0]
+		files, dependencies = doxygen.page_dependencies(page)
+		run('page dependency files', sorted([os.path.basename(f) for f in files]), ['a.md', 'b.md', 'namespacetest.xml'])
+
+		markdown('a.md', [('test::colour', 'A colour.'), ('test::shape', 'A square shape.')])
+		run('rebind edited markdown', sorted(inputs.reload([a])), ['test::colour', 'test::shape'])
+		run('rebound docs', (brief('test::colour'), brief('test::shape')), (('Another colour.', 'b.md'), ('A square shape.', 'a.md')))
+		files, changed = doxygen.page_dependencies(page)
+		run('changed page dependencies', sorted([k for k in changed if changed[k] != dependencies.get(k)]), ['namespacetest_1shape'])
+
+		markdown('b.md', [('test::shape', 'Another shape.')])
+		run('rebind moved docs', sorted(inputs.reload([b])), ['test::colour', 'test::shape'])
+		run('rebound moved docs', (brief('test::colour'), brief('test::shape')), (('A colour.', 'a.md'), ('Another shape.', 'b.md')))
+
+		colour = doxygen._items['test::colour'][0].item
+		namespace_xml('test', ['colour', 'size'])
+		run('rebind edited xml', sorted(inputs.reload([xml])), ['test::colour', 'test::shape'])
+		run('replaced items', (doxygen._items['test::colour'][0].item is colour, 'test::shape' in doxygen._items, brief('test::size')), (False, False, None))
+		run('rebound replaced items', brief('test::colour'), ('A colour.', 'a.md'))
+		run('replaced item pages', [ref.item.qname for ref in inputs.items()[0].item.children], ['test::colour', 'test::size'])
+
+	class Messages:
+		def __init__(self):
+			self.messages = []
+
+		def write(self, text):
+			self.messages.append(text)
+
+		def flush(self):
+			pass
+
+	def build_output(name, options):
+		outdir = os.path.join(tempdir, name)
+		xml = namespace_xml('test', ['colour', 'shape'], ['shape'])
+		md = markdown('lazy.md', [('test::colour', 'A colour.'), ('test::shape', 'A shape.'), ('test::size', 'A size.')])
+		sys.stderr = Messages()
+		try:
+			doxygen.build([xml], [md], outdir, options)
+			messages = sys.stderr.messages
+		finally:
+			sys.stderr = sys.__stderr__
+		pages = {}
+		for filename in os.listdir(outdir):
+			with open(os.path.join(outdir, filename), 'rb') as f:
+				pages[filename] = f.read()
+		return pages, messages
+
+	eager = build_output('eager', {})
+	run('eager build messages', [m for m in eager[1] if m], ['error: item test::size not found\n', 'error: item test is not documented\n'])
+	run('lazy build', build_output('lazy', {'lazy': True}), eager)
+	run('lazy parallel build', build_output('lazy-jobs', {'lazy': True, 'jobs': 2}), eager)
+else:
+	print('markdown binding tests skipped -- the installed markdown version is not supported by docs.py')
+
+shutil.rmtree(tempdir)
+
+summary()
@@ -0,0 +1,123 @@
+#!/usr/bin/python
+
+# Copyright (C) 2014 Reece H. Dunn
+#
+# This file is part of documentation-generator.
+#
+# documentation-generator is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# documentation-generator is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with documentation-generator.  If not, see <http://www.gnu.org/licenses/>.
+
+import os
+import sys
+import tempfile
+import argparse
+
+from timeit import default_timer as timer
+
+sys.path.append(os.path.join(sys.path[0], '..'))
+
+import xmlapi
+
+_memberdef = '''
+      <memberdef kind="function" id="classa_1f%(n)d" prot="public" static="no" const="no" explicit="no" inline="no" virt="non-virtual">
+        <type>const <ref refid="classb" kindref="compound">b</ref> &amp;</type>
+        <definition>const b &amp; a::f%(n)d</definition>
+        <argsstring>(int x, const char *y) const</argsstring>
+        <name>f%(n)d</name>
+        <param>
+          <type>int</type>
+          <declname>x</declname>
+        </param>
+        <param>
+          <type>const char *</type>
+          <declname>y</declname>
+        </param>
+        <briefdescription>
+        </briefdescription>
+        <detaileddescription>
+        </detaileddescription>
+        <inbodydescription>
+        </inbodydescription>
+        <location file="a.hpp" line="%(n)d"/>
+      </memberdef>'''
+
+# The selectors used by doxygen.py, and the node they are evaluated on.
+_selectors = [
+	('@kind', 'memberdef'),
+	('@id', 'memberdef'),
+	('name/text()', 'memberdef'),
+	('location', 'memberdef'),
+	('declname/text()', 'param'),
+	('type', 'param'),
+]
+
+
+def document(members):
+	return '<doxygen><compounddef id="classa" kind="class"><compoundname>a</compoundname><sectiondef kind="public-func">%s</sectiondef></compounddef></doxygen>' % \
+		''.join([_memberdef % {'n': n} for n in range(members)])
+
+
+def nodes(xml):
+	compound = list(xml)[0]
+	memberdefs = list(compound.select('sectiondef/memberdef'))
+	params = list(compound.select('sectiondef/memberdef/param'))
+	return {'memberdef': memberdefs, 'param': params}
+
+
+def interpreted(selector):
+	parsed = xmlapi.parse_selector(selector)
+	def first(node):
+		for match in parsed.select(node):
+			return match
+		return None
+	return first
+
+
+def compiled(selector):
+	return xmlapi.compile_selector(selector).first
+
+
+def measure(nodes, first, repeat):
+	best = None
+	for _ in range(repeat):
+		start = timer()
+		for node in nodes:
+			first(node)
+		elapsed = timer() - start
+		if best is None or elapsed < best:
+			best = elapsed
+	return len(nodes) / max(best, 1e-9)
+
+
+def main():
+	parser = argparse.ArgumentParser(description='Measure the speed of the xmlapi selectors used by doxygen.py.')
+	parser.add_argument('--members', type=int, default=2000, help='number of memberdef nodes in the document')
+	parser.add_argument('--repeat', type=int, default=5, help='number of timed runs (the best is reported)')
+	args = parser.parse_args()
+
+	fd, filename = tempfile.mkstemp(suffix='.xml')
+	with os.fdopen(fd, 'w') as f:
+		f.write(document(args.members))
+	try:
+		for backend in [xmlapi.XmlDocument, xmlapi.ElementTreeDocument]:
+			selected = nodes(backend(filename))
+			for selector, context in _selectors:
+				before = measure(selected[context], interpreted(selector), args.repeat)
+				after = measure(selected[context], compiled(selector), args.repeat)
+				print('%-20s %-16s %10.0f lookups/sec interpreted %10.0f lookups/sec compiled (%.1fx)' % (backend.__name__, selector, before, after, after / before))
+	finally:
+		os.remove(filename)
+
+
+if __name__ == '__main__':
+	main()
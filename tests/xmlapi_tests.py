@@ -0,0 +1,158 @@
+#!/usr/bin/python
+
+# Copyright (C) 2014 Reece H. Dunn
+#
+# This file is part of documentation-generator.
+#
+# documentation-generator is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# documentation-generator is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with documentation-generator.  If not, see <http://www.gnu.org/licenses/>.
+
+import os
+import sys
+import tempfile
+
+sys.path.append(os.path.join(sys.path[0], '..'))
+
+import xmlapi
+
+passed = 0
+failed = 0
+
+def run(name, got, expected):
+	global passed
+	global failed
+	if expected == got:
+		passed = passed + 1
+	else:
+		print('%s test failed -- expected %s, got %s' % (name, repr(expected), repr(got)))
+		failed = failed + 1
+
+def summary():
+	print('passed : %d' % passed)
+	print('failed : %d' % failed)
+	print('total  : %d' % (passed + failed))
+
+document = '''<?xml version='1.0' encoding='UTF-8' standalone='no'?>
+<doxygen version="1.8.6">
+  <compounddef id="classa" kind="class" prot="public">
+    <compoundname>a</compoundname>
+    <sectiondef kind="public-func">
+      <memberdef kind="function" id="classa_1f" prot="public" static="">
+        <type>const <ref refid="classb" kindref="compound">b</ref> &amp;</type>
+        <name>f</name>
+        <param>
+          <type>int</type>
+          <declname>x</declname>
+        </param>
+        <location file="a.hpp" line="3"/>
+      </memberdef>
+      <memberdef kind="variable" id="classa_1v" prot="private">
+        <type>int</type>
+        <name>v</name>
+      </memberdef>
+    </sectiondef>
+  </compounddef>
+  <compounddef id="classb" kind="class" prot="public">
+    <compoundname>b</compoundname>
+  </compounddef>
+</doxygen>
+'''
+
+fd, filename = tempfile.mkstemp(suffix='.xml')
+with os.fdopen(fd, 'w') as f:
+	f.write(document)
+
+def simplify(value):
+	if isinstance(value, xmlapi.XmlNode):
+		return value.name
+	return value
+
+for backend in [xmlapi.XmlDocument, xmlapi.ElementTreeDocument]:
+	name = backend.__name__
+	xml = backend(filename)
+	run('%s document attribute' % name, xml['@version'], '1.8.6')
+	compounds = list(xml)
+	run('%s compounds' % name, [c['@id'] for c in compounds], ['classa', 'classb'])
+	a = compounds[0]
+	run('%s child text' % name, a['compoundname/text()'], 'a')
+	run('%s missing node' % name, a['briefdescription'], None)
+	run('%s missing attribute' % name, a['@static'], None)
+	member = a['sectiondef/memberdef']
+	run('%s empty attribute' % name, member['@static'], '')
+	run('%s iterate elements' % name, [c.name for c in member], ['type', 'name', 'param', 'location'])
+	run('%s children' % name, [(c.name, c.value) for c in member['type'].children()], [('#text', 'const '), ('ref', None), ('#text', ' &')])
+	run('%s descendant text' % name, member['type/text()'], 'const b &')
+	run('%s reused wrappers' % name, list(member)[0] is list(member)[0] and list(member.children())[1] is list(member)[0], True)
+	run('%s named elements' % name, [c['declname/text()'] for c in member.elements('param')], ['x'])
+	run('%s no named elements' % name, list(member.elements('enumvalue')), [])
+	run('%s slots' % name, hasattr(member, '__dict__'), False)
+	run('%s descendants' % name, [n.name for n in a.descendants('type')], ['type', 'type', 'type'])
+	run('%s descendants of a child' % name, [n.value for n in member.descendants('type')[0].children()], ['const ', None, ' &'])
+	run('%s no descendants' % name, list(member.descendants('compoundname')), [])
+	run('%s memoized text' % name, member['type'].text() is member['type'].text(), True)
+	run('%s text pieces' % name, list(a.itertext())[1:3], ['a', '\n    '])
+	run('%s nested selector' % name, member['param/declname/text()'], 'x')
+	run('%s attribute predicate' % name, simplify(a['sectiondef/memberdef[@kind="variable"]/name/text()']), 'v')
+	run('%s select' % name, list(a.select('sectiondef/memberdef/@prot')), ['public', 'private'])
+	for selector in ['@kind', 'compoundname/text()', 'sectiondef/memberdef', 'sectiondef/memberdef/param/declname/text()',
+	                 'sectiondef/memberdef[@kind="function"]/location/@line', 'sectiondef[memberdef]', 'sectiondef/memberdef[@kind="enum"]',
+	                 '//memberdef/@id', '//type', 'sectiondef//declname/text()', '//memberdef[@prot="private"]/name/text()',
+	                 'sectiondef/memberdef[2]/@id', '//type[3]', '//type[4]', '//ref[1]/@refid', '//memberdef[//declname]/@id']:
+		expected = [simplify(x) for x in xmlapi.parse_selector(selector).select(a)]
+		run('%s compiled %s' % (name, selector), [simplify(x) for x in a.select(selector)], expected)
+		run('%s compiled first %s' % (name, selector), simplify(a[selector]), expected[0] if expected else None)
+	for selector, expected in [('//memberdef[2]/@id', ['classa_1v']), ('//type[1]/text()', ['const b &', 'int', 'int']), ('//type[2]', [])]:
+		run('%s xpath position %s' % (name, selector), [simplify(x) for x in a.select(selector)], expected)
+		run('%s interpreted xpath position %s' % (name, selector), [simplify(x) for x in xmlapi.parse_selector(selector).select(a)], expected)
+
+run('ElementTreeDocument descendants', [n['@id'] for n in xmlapi.ElementTreeDocument(filename).select('//compounddef')], ['classa', 'classb'])
+run('XmlDocument descendants', [n['@id'] for n in xmlapi.XmlDocument(filename).select('//compounddef')], ['classa', 'classb'])
+xml = xmlapi.ElementTreeDocument(filename)
+run('ElementTreeDocument descendant then iterate', (xml['//compounddef/@id'], [c['@id'] for c in xml], [c['@id'] for c in xml]), ('classa', ['classa', 'classb'], ['classa', 'classb']))
+run('ElementTreeDocument indexed descendants', xml.descendants('memberdef')[0]._tag_index is xml._tag_index, True)
+xml = xmlapi.ElementTreeDocument(filename)
+for c in xml:
+	run('ElementTreeDocument descendants after iterating', ([n['@id'] for n in xml.select('//compounddef')], [c['@id'] for c in xml]), (['classb'], ['classb']))
+	break
+xml = xmlapi.ElementTreeDocument(filename)
+run('ElementTreeDocument elements', ([c['@id'] for c in xml.elements('compounddef')], [c['@id'] for c in xml.children() if c.name == 'compounddef']), (['classa', 'classb'], ['classa', 'classb']))
+xml = xmlapi.ElementTreeDocument(filename, accept=lambda node: node['@id'] != 'classa', discard=['type'])
+run('ElementTreeDocument accept', [c['@id'] for c in xml], ['classb'])
+xml = xmlapi.ElementTreeDocument(filename, discard=['type', 'sectiondef'])
+a = list(xml)[0]
+run('ElementTreeDocument discard', (a['compoundname/text()'], a['sectiondef'].text(), list(a['sectiondef'])), ('a', '', []))
+run('start tag', xmlapi.start_tag(filename, 'memberdef'), {'kind': 'function', 'id': 'classa_1f', 'prot': 'public', 'static': ''})
+run('missing start tag', xmlapi.start_tag(filename, 'enumvalue'), None)
+
+os.remove(filename)
+
+nested = '<a>' + '<b>x' * 5000 + '</b>y' * 5000 + '</a>'
+fd, filename = tempfile.mkstemp(suffix='.xml')
+with os.fdopen(fd, 'w') as f:
+	f.write(nested)
+for backend in [xmlapi.XmlDocument]:
+	name = backend.__name__
+	run('%s deeply nested text' % name, backend(filename).text(), 'x' * 5000 + 'y' * 5000)
+os.remove(filename)
+size = xmlapi.selector_cache_size
+xmlapi.selector_cache_size = 2
+for selector in ['a', 'b', 'c', 'a/b', 'a/c']:
+	xmlapi.compile_selector(selector)
+run('bounded selector cache', (len(xmlapi._selector_cache) <= 2, len(xmlapi._compiled_selector_cache) <= 2), (True, True))
+xmlapi.clear_selector_cache()
+run('cleared selector cache', (len(xmlapi._selector_cache), len(xmlapi._compiled_selector_cache)), (0, 0))
+xmlapi.selector_cache_size = size
+
+run('ElementTreeNode deeply nested text', xmlapi.ElementTreeNode(xmlapi.ElementTree.fromstring(nested)).text(), 'x' * 5000 + 'y' * 5000)
+
+summary()
@@ -21,8 +21,38 @@ import os
 import sys
 import re
 
+from array import array
+from bisect import bisect_right
+
 from xml.dom import minidom
 
+try:
+	from xml.etree import cElementTree as ElementTree
+except ImportError:
+	from xml.etree import ElementTree
+
+
+class CompiledSelector:
+	"""
+	A selector compiled into closures.
+
+	`select(item)` returns an iterable over all the matches, and `first(item)`
+	returns the first match, or None if there are no matches, without
+	evaluating the rest of the selector.
+	"""
+
+	def __init__(self, select, first):
+		self.select = select
+		self.first = first
+
+
+def _first(select):
+	def first(item):
+		for match in select(item):
+			return match
+		return None
+	return first
+
 
 class NodeSelector:
 	def __init__(self, name):
@@ -37,6 +67,44 @@ class NodeSelector:
 			if node.name == self.name:
 				yield node
 
+	def compile(self):
+		name = self.name
+		def select(item):
+			return iter(item.elements(name))
+		def first(item):
+			nodes = item.elements(name)
+			if nodes:
+				return nodes[0]
+			return None
+		return CompiledSelector(select, first)
+
+
+class DescendantSelector:
+	def __init__(self, name):
+		self.typename = 'descendant'
+		self.name = name
+
+	def __repr__(self):
+		return 'Descendant(%s)' % self.name
+
+	def select(self, item):
+		for node in item:
+			if node.name == self.name:
+				yield node
+			for match in self.select(node):
+				yield match
+
+	def compile(self):
+		name = self.name
+		def select(item):
+			return iter(item.descendants(name))
+		def first(item):
+			nodes = item.descendants(name)
+			if nodes:
+				return nodes[0]
+			return None
+		return CompiledSelector(select, first)
+
 
 class AttributeSelector:
 	def __init__(self, name):
@@ -47,10 +115,20 @@ class AttributeSelector:
 		return 'Attr(%s)' % self.name
 
 	def select(self, item):
-		if item.node.attributes:
-			ret = item.node.attributes.get(self.name, None)
-			if ret:
-				yield ret.value
+		ret = item.attribute(self.name)
+		if ret is not None:
+			yield ret
+
+	def compile(self):
+		name = self.name
+		def select(item):
+			ret = item.attribute(name)
+			if ret is None:
+				return ()
+			return (ret,)
+		def first(item):
+			return item.attribute(name)
+		return CompiledSelector(select, first)
 
 
 class TextSelector:
@@ -61,16 +139,14 @@ class TextSelector:
 		return 'text()'
 
 	def select(self, item):
-		yield ''.join(self._text(item.node))
+		yield item.text()
 
-	def _text(self, node):
-		ret = []
-		for child in node.childNodes:
-			if child.nodeType == child.TEXT_NODE:
-				ret.append(child.nodeValue)
-			elif child.nodeType == child.ELEMENT_NODE:
-				ret.extend(self._text(child))
-		return ret
+	def compile(self):
+		def select(item):
+			return (item.text(),)
+		def first(item):
+			return item.text()
+		return CompiledSelector(select, first)
 
 
 class EqualsSelector:
@@ -87,6 +163,15 @@ class EqualsSelector:
 			if value == self.value:
 				yield value
 
+	def compile(self):
+		selector = self.selector.compile().select
+		expected = self.value
+		def select(item):
+			for value in selector(item):
+				if value == expected:
+					yield value
+		return CompiledSelector(select, _first(select))
+
 
 class IfSelector:
 	def __init__(self, node, selector):
@@ -102,6 +187,84 @@ class IfSelector:
 			for value in self.selector.select(node):
 				yield node
 
+	def compile(self):
+		nodes = self.node.compile().select
+		selector = self.selector.compile()
+		predicate = selector.select
+		matches = selector.first
+		def select(item):
+			for node in nodes(item):
+				for value in predicate(node):
+					yield node
+		def first(item):
+			for node in nodes(item):
+				if matches(node) is not None:
+					return node
+			return None
+		return CompiledSelector(select, first)
+
+
+def _nth_children(item, name, position, descendants):
+	# The nodes in `descendants` that are the `position`-th child called `name`
+	# of their parent, where the parent is `item` or one of its descendants.
+	selected = set()
+	stack = [item]
+	while stack:
+		node = stack.pop()
+		nodes = node.elements(name)
+		if len(nodes) >= position:
+			selected.add(id(nodes[position - 1]))
+		stack.extend(node)
+	return [node for node in descendants if id(node) in selected]
+
+
+class PositionSelector:
+	"""
+	Selects the node at the given position (starting at 1) of the nodes that
+	the `node` selector matches.
+
+	As in XPath, `//name[n]` selects the n-th `name` child of each node, not
+	the n-th `name` descendant (XPath's `(//name)[n]`).
+	"""
+
+	def __init__(self, node, position):
+		self.typename = 'position'
+		self.node = node
+		self.position = position
+
+	def __repr__(self):
+		return '%s.At(%d)' % (self.node, self.position)
+
+	def select(self, item):
+		if isinstance(self.node, DescendantSelector):
+			for node in _nth_children(item, self.node.name, self.position, list(self.node.select(item))):
+				yield node
+			return
+		for i, node in enumerate(self.node.select(item)):
+			if i + 1 == self.position:
+				yield node
+				break
+
+	def compile(self):
+		position = self.position
+		if isinstance(self.node, DescendantSelector):
+			name = self.node.name
+			def select(item):
+				return iter(_nth_children(item, name, position, item.descendants(name)))
+			return CompiledSelector(select, _first(select))
+		nodes = self.node.compile().select
+		def select(item):
+			for i, node in enumerate(nodes(item)):
+				if i + 1 == position:
+					return (node,)
+			return ()
+		def first(item):
+			for i, node in enumerate(nodes(item)):
+				if i + 1 == position:
+					return node
+			return None
+		return CompiledSelector(select, first)
+
 
 class ChildSelector:
 	def __init__(self, node, selector):
@@ -117,15 +280,48 @@ class ChildSelector:
 			for match in self.selector.select(node):
 				yield match
 
+	def compile(self):
+		if isinstance(self.node, NodeSelector) and isinstance(self.selector, TextSelector):
+			return self._compile_node_text(self.node.name)
+		nodes = self.node.compile().select
+		selector = self.selector.compile()
+		matches = selector.select
+		match = selector.first
+		def select(item):
+			for node in nodes(item):
+				for value in matches(node):
+					yield value
+		def first(item):
+			for node in nodes(item):
+				value = match(node)
+				if value is not None:
+					return value
+			return None
+		return CompiledSelector(select, first)
+
+	def _compile_node_text(self, name):
+		# name/text() -- the text of the named child elements
+		def select(item):
+			for node in item.elements(name):
+				yield node.text()
+		def first(item):
+			nodes = item.elements(name)
+			if nodes:
+				return nodes[0].text()
+			return None
+		return CompiledSelector(select, first)
+
 
 _tokens = [
 	(re.compile(r'text\(\)'), 'text()'),
+	(re.compile(r'[0-9]+'), 'number'),
 	(re.compile(r'[a-zA-Z0-9\_]+'), 'name'),
 	(re.compile(r'"[^"]*"'), 'string'),
 	(re.compile(r'\['), '['),
 	(re.compile(r'\]'), ']'),
 	(re.compile(r'@'), '@'),
 	(re.compile(r'='), '='),
+	(re.compile(r'//'), '//'),
 	(re.compile(r'/'), '/'),
 ]
 
@@ -148,10 +344,16 @@ def tokenizer(selector):
 		yield token, value
 
 
+# The maximum number of selectors kept in each of the selector caches. A cache
+# is emptied when it is full.
+selector_cache_size = 256
+
 _selector_cache = {}
 def parse_selector(selector):
-	if selector in _selector_cache.keys():
+	try:
 		return _selector_cache[selector]
+	except KeyError:
+		pass
 
 	stack = []
 	for token, value in tokenizer(selector):
@@ -163,6 +365,11 @@ def parse_selector(selector):
 			if top == '@':
 				stack = stack[:-1]
 				stack.append(('selector', AttributeSelector(value)))
+			elif top == '//':
+				stack = stack[:-1]
+				if len(stack) > 0 and stack[-1][0] == 'selector':
+					stack.append(('/', '/'))
+				stack.append(('selector', DescendantSelector(value)))
 			else:
 				stack.append(('selector', NodeSelector(value)))
 		elif token == 'string':
@@ -174,13 +381,16 @@ def parse_selector(selector):
 			else:
 				raise Exception('XPath: invalid syntax for - %s' % selector)
 		elif token == ']':
-			_, a = stack[-1]
+			t, a = stack[-1]
 			b, _ = stack[-2]
 			_, c = stack[-3]
 			if b != '[':
 				raise Exception('XPath: invalid syntax for - %s' % selector)
 			stack = stack[:-3]
-			stack.append(('selector', IfSelector(c, a)))
+			if t == 'number':
+				stack.append(('selector', PositionSelector(c, int(a))))
+			else:
+				stack.append(('selector', IfSelector(c, a)))
 		elif token == 'text()':
 			stack.append(('selector', TextSelector()))
 		else:
@@ -194,33 +404,357 @@ def parse_selector(selector):
 		stack = stack[:-3]
 		stack.append(('selector', ChildSelector(c, a)))
 
+	if len(_selector_cache) >= selector_cache_size:
+		_selector_cache.clear()
 	_selector_cache[selector] = stack[0][1]
 	return stack[0][1]
 
 
-class XmlNode:
+_compiled_selector_cache = {}
+def compile_selector(selector):
+	try:
+		return _compiled_selector_cache[selector]
+	except KeyError:
+		pass
+	ret = parse_selector(selector).compile()
+	if len(_compiled_selector_cache) >= selector_cache_size:
+		_compiled_selector_cache.clear()
+	_compiled_selector_cache[selector] = ret
+	return ret
+
+
+def clear_selector_cache():
+	_selector_cache.clear()
+	_compiled_selector_cache.clear()
+
+
+class XmlNode(object):
+	"""
+	An XML node backed by a `xml.dom.minidom` node.
+
+	The child node wrappers are created on first access and reused for later
+	traversals. A mapping from element name to the child elements with that
+	name is also built on first use, for the selectors to use.
+	"""
+
+	__slots__ = ('node', 'name', '_children', '_elements', '_index', '_text', '_order', '_end', '_tag_index')
+
 	def __init__(self, node):
+		self._init_node(node, node.nodeName)
+
+	def _init_node(self, node, name):
+		# The slots shared by all the node types.
 		self.node = node
-		self.name = node.nodeName
+		self.name = name
+		self._children = None
+		self._elements = None
+		self._index = None
+		self._text = None
+		self._order = 0
+		self._end = 0
+		self._tag_index = None
 
 	def __iter__(self):
-		for child in self.node.childNodes:
-			if child.nodeType == child.ELEMENT_NODE:
-				yield XmlNode(child)
+		if self._children is None:
+			self._load_children()
+		return iter(self._elements)
 
 	def __getitem__(self, xpath):
-		for item in self.select(xpath):
-			return item
+		return compile_selector(xpath).first(self)
+
+	@property
+	def value(self):
+		return self.node.nodeValue
+
+	def attribute(self, name):
+		if self.node.attributes:
+			ret = self.node.attributes.get(name, None)
+			if ret:
+				return ret.value
 		return None
 
-	def children(self):
+	def text(self):
+		if self._text is None:
+			self._text = ''.join(self.itertext())
+		return self._text
+
+	def itertext(self):
+		"""
+		Iterate over the text of the descendant nodes, in document order.
+		"""
+		stack = [iter(self.node.childNodes)]
+		while stack:
+			for child in stack[-1]:
+				if child.nodeType == child.TEXT_NODE:
+					yield child.nodeValue
+				elif child.nodeType == child.ELEMENT_NODE:
+					stack.append(iter(child.childNodes))
+					break
+			else:
+				stack.pop()
+
+	def _load_children(self):
+		self._children = []
+		self._elements = []
 		for child in self.node.childNodes:
-			yield XmlNode(child)
+			node = XmlNode(child)
+			self._children.append(node)
+			if child.nodeType == child.ELEMENT_NODE:
+				self._elements.append(node)
+
+	def children(self):
+		if self._children is None:
+			self._load_children()
+		return iter(self._children)
+
+	def elements(self, name):
+		"""
+		Returns the list of child elements called `name`, in document order.
+		"""
+		if self._index is None:
+			if self._children is None:
+				self._load_children()
+			self._index = {}
+			for child in self._elements:
+				try:
+					self._index[child.name].append(child)
+				except KeyError:
+					self._index[child.name] = [child]
+		return self._index.get(name, ())
+
+	def descendants(self, name):
+		"""
+		Returns the list of descendant elements called `name`, in document order.
+
+		This uses a tag index built on first use for the node the query is made
+		on, which also covers every node below it.
+		"""
+		index = self._tag_index
+		if index is None:
+			index = TagIndex(self)
+		nodes = index.nodes.get(name)
+		if not nodes:
+			return ()
+		orders = index.orders[name]
+		return nodes[bisect_right(orders, self._order):bisect_right(orders, self._end)]
 
 	def select(self, xpath):
-		return parse_selector(xpath).select(self)
+		return compile_selector(xpath).select(self)
+
+
+class TagIndex(object):
+	"""
+	Maps an element name to the elements with that name below a root node.
+
+	Each node in the tree is numbered in document order, recording its number
+	and the number of its last descendant, so the descendants of any indexed
+	node are a contiguous range of each list.
+	"""
+
+	__slots__ = ('nodes', 'orders')
+
+	def __init__(self, root):
+		self.nodes = {}
+		self.orders = {}
+		order = 0
+		root._order = order
+		root._tag_index = self
+		stack = [(root, iter(root))]
+		while stack:
+			node, children = stack[-1]
+			for child in children:
+				order = order + 1
+				child._order = order
+				child._tag_index = self
+				try:
+					self.nodes[child.name].append(child)
+					self.orders[child.name].append(order)
+				except KeyError:
+					self.nodes[child.name] = [child]
+					self.orders[child.name] = array('I', [order])
+				stack.append((child, iter(child)))
+				break
+			else:
+				stack.pop()
+				node._end = order
 
 
 class XmlDocument(XmlNode):
+	__slots__ = ()
+
 	def __init__(self, filename):
 		XmlNode.__init__(self, minidom.parse(filename).documentElement)
+
+
+class ElementTreeText(XmlNode):
+	"""
+	A text node in an `ElementTreeNode`, from the text or tail of an element.
+	"""
+
+	__slots__ = ()
+
+	def __init__(self, value):
+		self._init_node(value, '#text')
+
+	@property
+	def value(self):
+		return self.node
+
+	def attribute(self, name):
+		return None
+
+	def text(self):
+		return ''
+
+	def itertext(self):
+		return iter(())
+
+	def _load_children(self):
+		self._children = ()
+		self._elements = ()
+
+
+class ElementTreeNode(XmlNode):
+	"""
+	An XML node backed by an `xml.etree.ElementTree` element.
+	"""
+
+	__slots__ = ()
+
+	def __init__(self, element):
+		self._init_node(element, element.tag)
+
+	@property
+	def value(self):
+		return None
+
+	def attribute(self, name):
+		return self.node.get(name)
+
+	def itertext(self):
+		if self.node.text:
+			yield self.node.text
+		stack = [(None, iter(self.node))]
+		while stack:
+			element, children = stack[-1]
+			for child in children:
+				if child.text:
+					yield child.text
+				stack.append((child, iter(child)))
+				break
+			else:
+				stack.pop()
+				if element is not None and element.tail:
+					yield element.tail
+
+	def _load_children(self):
+		self._children = []
+		self._elements = []
+		if self.node.text:
+			self._children.append(ElementTreeText(self.node.text))
+		for child in self.node:
+			node = ElementTreeNode(child)
+			self._children.append(node)
+			self._elements.append(node)
+			if child.tail:
+				self._children.append(ElementTreeText(child.tail))
+
+
+class ElementTreeDocument(ElementTreeNode):
+	"""
+	An XML document that is parsed incrementally with `ElementTree.iterparse`.
+
+	Iterating over the document yields each child of the document element once
+	it has been fully parsed. That child is then removed from the document, so
+	only one child is kept in memory at a time. As such, the document can only
+	be iterated over once.
+
+	Looking up the child elements or descendants of the document (including
+	with `select`) reads the rest of the document into memory and indexes it
+	like any other node, so the remaining children can then be iterated over
+	again. The children that have already been yielded are not included.
+
+	If `accept` is given, it is called with each child of the document element
+	when its start tag is read, so only the name and attributes are available.
+	Children it returns False for are discarded while they are parsed, and are
+	not yielded. The content of any element whose name is in `discard` is also
+	dropped while it is parsed, leaving an empty element.
+	"""
+
+	__slots__ = ('_events', '_accept', '_discard', '_loaded')
+
+	def __init__(self, filename, accept=None, discard=()):
+		self._events = ElementTree.iterparse(filename, events=('start', 'end'))
+		self._accept = accept
+		self._discard = frozenset(discard)
+		_, element = next(self._events)
+		ElementTreeNode.__init__(self, element)
+		self._loaded = False
+
+	def __iter__(self):
+		if self._loaded:
+			return ElementTreeNode.__iter__(self)
+		return self._stream(True)
+
+	def _stream(self, remove):
+		depth = 0
+		discard_depth = None
+		rejected = False
+		for event, element in self._events:
+			if event == 'start':
+				depth = depth + 1
+				if discard_depth is not None:
+					pass
+				elif depth == 1 and self._accept and not self._accept(ElementTreeNode(element)):
+					rejected = True
+					discard_depth = depth
+				elif element.tag in self._discard:
+					discard_depth = depth
+				continue
+			if discard_depth is not None:
+				del element[:]
+				element.text = None
+				if depth == discard_depth:
+					discard_depth = None
+			depth = depth - 1
+			if depth == 0:
+				if remove or rejected:
+					self.node.remove(element)
+				if not rejected:
+					yield ElementTreeNode(element)
+				rejected = False
+			elif depth < 0: # end of the document element
+				break
+
+	def _load(self):
+		if not self._loaded:
+			for child in self._stream(False):
+				pass
+			self._loaded = True
+			self._children = None
+
+	def children(self):
+		if self._loaded:
+			return ElementTreeNode.children(self)
+		return iter(self)
+
+	def elements(self, name):
+		self._load()
+		return ElementTreeNode.elements(self, name)
+
+	def descendants(self, name):
+		self._load()
+		return ElementTreeNode.descendants(self, name)
+
+
+def start_tag(filename, name):
+	"""
+	Returns the attributes of the first element called `name` in the XML file,
+	or None if there is no such element. The file is only read as far as that
+	element's start tag.
+	"""
+	with open(filename, 'rb') as f:
+		for _, element in ElementTree.iterparse(f, events=('start',)):
+			if element.tag == name:
+				return dict(element.attrib)
+	return None